@@ -7,22 +7,57 @@
 
 # Modules
 import pprint
+import random
+from array import array
+
+from evaluation import SQUARE_SCORES
+from geometry import (SQUARE_NAMES, SQUARE_INDEXES, SQUARE_ROWS, SQUARE_COLUMNS, GENERAL_MOVES, ADVISOR_MOVES,
+                      ELEPHANT_MOVES, HORSE_MOVES, SOLDIER_MOVES, LEAPER_ATTACKS, RAYS, PIECE_NAMES, PIECE_CODES)
+
+# Ranks of the pieces for ordering captures, most valuable victim first and least valuable attacker first.
+CAPTURE_RANKS = {'GENERAL': 7, 'CHARIOT': 6, 'CANNON': 5, 'HORSE': 4, 'ADVISOR': 2, 'ELEPHANT': 2, 'SOLDIER': 1}
+
+# Zobrist keys: one random 64 bit number for every player, piece name and square, and one for black to move. The key
+# of a position is the XOR of the numbers of its pieces, so a move only has to XOR out and in what it changes. A fixed
+# seed keeps keys the same between runs so they can be stored.
+ZOBRIST_RANDOM = random.Random(0x5851F42D4C957F2D)
+ZOBRIST_PIECE_KEYS = {(player, name): tuple(ZOBRIST_RANDOM.getrandbits(64) for _ in range(90))
+                      for player in ('red', 'black')
+                      for name in PIECE_NAMES}
+ZOBRIST_BLACK_TO_MOVE = ZOBRIST_RANDOM.getrandbits(64)
+
 
 class Xiangqi:
     """
     Main game engine of the game Xiangqi, or Chinese Chess.
     """
 
-    def __init__(self):
+    def __init__(self, backend='pieces', piece_list=None, player_turn='red'):
         """
         The related reference variables for the game.
+        :param backend: Move generator to use, 'pieces' for the piece classes or 'bitboard' for bitboards.
+        :param piece_list: Pieces to start from, already placed on their squares. Defaults to a new game. The move
+        pools of given pieces are only generated when they are first needed.
+        :param player_turn: Player to move first, 'red' or 'black'.
         _board - A list that contains every alphanumeric possible location that a piece can move.
         _red_pieces_information - Quick reference of red piece key details for debugging
         _black_pieces_information - Quick reference of black piece key details for debugging
         _player_turn - Current active player, 'red' or 'black'
         _game_state - Current state of the game UNFINISHED, RED_WON, BLACK_WON, STALEMATE
         _active_pieces - List containing all active pieces on the board.
+        _mailbox - 90 entry list indexed by square that holds the piece on each square, or None if it is empty.
+        _piece_information_current - False when the player dictionaries need rebuilding before they are shown.
+        _bitboards - BitboardPosition kept in sync with _mailbox when the bitboard backend is selected, otherwise None.
+        _generals - The General piece of each player, keyed by 'red' or 'black'.
+        _undo_stack - One record per move made with push, used by pop to take the move back.
+        _move_pool_current - False when moves were pushed or popped since the move pools were last updated.
+        _zobrist_key - 64 bit Zobrist key of the position and player turn, updated by push and pop.
+        _halfmove_clock - Number of moves since the last capture, updated by push and pop.
+        _fullmove_number - Number of the current full move, starting at 1 and raised after every black move.
+        _score - Material and piece-square score of red minus black from evaluation.py, updated by push and pop.
         """
+        if backend != 'pieces' and backend != 'bitboard':
+            raise ValueError("backend must be 'pieces' or 'bitboard'")
 
         # Reference for in bound moves
         # Red Side
@@ -42,16 +77,158 @@ class Xiangqi:
         # Player dictionaries/sets for important piece data.
         self._red_pieces_information = {}
         self._black_pieces_information = {}
+        self._piece_information_current = False
 
         # START OF GAME. Red goes first.
-        self._player_turn = 'black'
+        self._player_turn = player_turn
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
 
-        # Options are RED_WON, BLACK_WON, STALE_MATE, or UNFINISHED
+        # Options are RED_WON, BLACK_WON, STALEMATE, or UNFINISHED
         self._game_state = 'UNFINISHED'
 
         # Loads initial game pieces and adds them to the player dictionaries.
-        self._active_pieces = NewGame()
-        self.update_move_pool(self._active_pieces)
+        new_game = piece_list is None
+        self._active_pieces = NewGame() if new_game else list(piece_list)
+
+        # Square to piece lookup kept in sync with _active_pieces by make_move.
+        self._mailbox = [None] * 90
+        for index, i in enumerate(self._active_pieces):
+            self._mailbox[i.get_square()] = i
+            i.set_active_index(index)
+
+        red_general, black_general = self.find_generals(self._active_pieces)
+        self._generals = {'red': red_general, 'black': black_general}
+        self._undo_stack = []
+        self._move_pool_current = False
+        self._zobrist_key = self.compute_zobrist_key()
+        self._score = self.compute_score()
+
+        self._bitboards = None
+        if backend == 'bitboard':
+            from bitboard import BitboardPosition
+            self._bitboards = BitboardPosition(self._active_pieces)
+
+        if new_game:
+            self.update_move_pool(self._active_pieces)
+
+    @classmethod
+    def from_fen(cls, fen, backend='pieces'):
+        """
+        Sets up a game from a position in Xiangqi FEN, such as
+        rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1
+        The rows are listed from row 10 down to row 1. Red pieces are upper case and black pieces lower case: K general,
+        A advisor, B or E elephant, N or H horse, R chariot, C cannon and P soldier. The side to move is w or r for
+        red and b for black. The move counters are optional.
+        :param fen: The position in FEN.
+        :param backend: Move generator to use, see __init__.
+        :return: The Xiangqi game of the position.
+        """
+        fields = fen.split()
+        if not fields:
+            raise ValueError("empty FEN")
+        rows = fields[0].split('/')
+        if len(rows) != 10:
+            raise ValueError("FEN must have 10 rows: " + fen)
+
+        piece_list = []
+        generals = {'red': 0, 'black': 0}
+        for row, text in zip(range(9, -1, -1), rows):
+            column = 0
+            for letter in text:
+                if letter.isdigit():
+                    column += int(letter)
+                    continue
+                if letter.upper() not in FEN_PIECES or column > 8:
+                    raise ValueError("bad FEN row: " + text)
+                piece = FEN_PIECES[letter.upper()]()
+                piece.set_player('red' if letter.isupper() else 'black')
+                piece.set_square(row * 9 + column)
+                piece_list.append(piece)
+                if piece.get_piece_name() == 'GENERAL':
+                    generals[piece.get_player()] += 1
+                column += 1
+            if column != 9:
+                raise ValueError("bad FEN row: " + text)
+        if generals['red'] != 1 or generals['black'] != 1:
+            raise ValueError("FEN must have one general per player: " + fen)
+
+        side = fields[1] if len(fields) > 1 else 'w'
+        if side not in ('w', 'r', 'b'):
+            raise ValueError("bad FEN side to move: " + side)
+
+        game = cls(backend, piece_list, 'black' if side == 'b' else 'red')
+        if len(fields) > 5:
+            game._halfmove_clock = int(fields[4])
+            game._fullmove_number = int(fields[5])
+        return game
+
+    def to_fen(self):
+        """
+        :return: The position, player turn and move counters in Xiangqi FEN, see from_fen.
+        """
+        rows = []
+        for row in range(9, -1, -1):
+            text = ''
+            empty = 0
+            for piece in self._mailbox[row * 9:row * 9 + 9]:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[piece.get_piece_name()]
+                text += letter if piece.get_player() == 'red' else letter.lower()
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        side = 'w' if self._player_turn == 'red' else 'b'
+        return '/'.join(rows) + ' ' + side + ' - - ' + str(self._halfmove_clock) + ' ' + str(self._fullmove_number)
+
+    @classmethod
+    def from_bytes(cls, data, backend='pieces'):
+        """
+        Sets up a game from the compact encoding made by to_bytes.
+        :param data: The 91 bytes of the position.
+        :param backend: Move generator to use, see __init__.
+        :return: The Xiangqi game of the position.
+        """
+        cells = array('b', data)
+        if len(cells) != 91:
+            raise ValueError("a position is 91 bytes")
+        if cells[90] not in (0, 1):
+            raise ValueError("bad side to move byte: %d" % cells[90])
+        piece_list = []
+        generals = {'red': 0, 'black': 0}
+        for square in range(90):
+            code = cells[square]
+            if code:
+                if abs(code) > len(PIECE_CLASSES):
+                    raise ValueError("bad piece code %d on %s" % (code, SQUARE_NAMES[square]))
+                piece = PIECE_CLASSES[abs(code) - 1]()
+                piece.set_player('red' if code > 0 else 'black')
+                piece.set_square(square)
+                piece_list.append(piece)
+                if piece.get_piece_name() == 'GENERAL':
+                    generals[piece.get_player()] += 1
+        if generals['red'] != 1 or generals['black'] != 1:
+            raise ValueError("position must have one general per player")
+        return cls(backend, piece_list, 'black' if cells[90] else 'red')
+
+    def to_bytes(self):
+        """
+        Encodes the position in 91 bytes: one signed byte per square holding the code of its piece from PIECE_CODES,
+        negative for black and 0 when the square is empty, then 0 for red to move or 1 for black to move. The move
+        counters and undo stack are not kept.
+        :return: The encoded position as bytes.
+        """
+        cells = array('b', bytes(91))
+        for i in self._active_pieces:
+            code = PIECE_CODES[i.get_piece_name()]
+            cells[i.get_square()] = code if i.get_player() == 'red' else -code
+        cells[90] = 0 if self._player_turn == 'red' else 1
+        return cells.tobytes()
 
     def pull_piece_information(self, piece_list):
         """
@@ -99,10 +276,30 @@ class Xiangqi:
     def get_active_pieces(self):
         return self._active_pieces
 
+    def get_piece_at(self, location):
+        """
+        :param location: The alphanumeric location a1 - i10.
+        :return: The piece at the location or None if the square is empty.
+        """
+        return self._mailbox[SQUARE_INDEXES[location]]
+
+    def get_piece_at_square(self, square):
+        """
+        :param square: The square index 0 - 89.
+        :return: The piece on the square or None if the square is empty.
+        """
+        return self._mailbox[square]
+
     def get_piece_data(self):
         """
     Prints red_pieces_information and black_pieces_information to screen.
     """
+        if not self._move_pool_current:
+            self.update_move_pool(self._active_pieces)
+        if not self._piece_information_current:
+            self.pull_piece_information(self._active_pieces)
+            self._piece_information_current = True
+
         print()
         print(self.get_game_state())
         print()
@@ -112,32 +309,259 @@ class Xiangqi:
 
     def update_move_pool(self, pieces):
         """
-    Takes in a piece object and updates its potential move pool.
-    :param pieces: The piece to check for legal moves.
+    Takes in a list of piece objects and updates their potential move pools. The generals are always updated as their
+    pools are trimmed by the moves of every enemy piece.
+    :param pieces: The pieces to check for legal moves.
     """
+        pieces = set(pieces)
+        pieces.update(self.find_generals(self._active_pieces))
+
         for i in pieces:
-            piece = i
-            if i.get_piece_name() == 'ADVISOR':
-                i.advisor_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'ELEPHANT':
-                i.elephant_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'HORSE':
-                i.horse_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'CHARIOT':
-                i.chariot_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'CANNON':
-                i.cannon_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'SOLDIER':
-                i.soldier_legal_moves(piece, self._board, self._active_pieces)
-            elif i.get_piece_name() == 'GENERAL':
-                i.general_legal_moves(piece, self._board, self._active_pieces)
-
-        self.general_cant_move_here(self.find_generals(pieces), pieces)
-        self.is_general_in_check(self.find_generals(pieces), pieces)
-
-        self.pull_piece_information(self._active_pieces)
+            self.generate_piece_moves(i)
+
+        self.general_cant_move_here(self.find_generals(self._active_pieces), self._active_pieces)
+        self.is_general_in_check(self.find_generals(self._active_pieces), self._active_pieces)
+
+        # The player dictionaries are only rebuilt when they are next shown.
+        self._piece_information_current = False
+        self._move_pool_current = True
         return
 
+    def generate_piece_moves(self, piece):
+        """
+    Regenerates the move pool of a single piece from the current board, without the general checks done by
+    update_move_pool.
+    :param piece: The piece to update the move pool of.
+    """
+        if self._bitboards is not None:
+            piece.set_move_pool(self._bitboards.piece_move_squares(piece.get_player(), piece.get_piece_name(),
+                                                                   piece.get_square()))
+        else:
+            piece.set_move_pool([end for start, end in piece.generate(self._mailbox)])
+
+    def generate_moves(self, player=None):
+        """
+    Yields the pseudo legal moves of a player as (start, end) squares, straight from the board. Moves that leave the
+    player's own general in check are included, and the move pools shown by get_piece_data are not used or updated.
+    Moves are made as they are consumed, so a caller that stops early does not pay for the rest.
+    :param player: 'red' or 'black', defaults to the current player.
+    """
+        if player is None:
+            player = self._player_turn
+        if self._bitboards is not None:
+            yield from self._bitboards.generate(player)
+            return
+
+        # A consumer may push and pop moves between two pieces, which reorders _active_pieces, so it is copied.
+        for i in list(self._active_pieces):
+            if i.get_player() == player:
+                yield from i.generate(self._mailbox)
+
+    def generate_captures(self, player=None):
+        """
+    Yields the pseudo legal captures of a player as (start, end) squares, without generating their quiet moves.
+    :param player: 'red' or 'black', defaults to the current player.
+    """
+        if player is None:
+            player = self._player_turn
+        if self._bitboards is not None:
+            yield from self._bitboards.generate(player, captures_only=True)
+            return
+
+        for i in list(self._active_pieces):
+            if i.get_player() == player:
+                yield from i.generate_captures(self._mailbox)
+
+    def staged_moves(self, hash_move=None, killers=(), history=None, quiets=True):
+        """
+    Yields the pseudo legal moves of the current player in stages, best first, so a consumer that stops early does not
+    pay for the later stages. The hash move comes first and is yielded before any other move is generated. Then come
+    the captures, generated on their own and sorted most valuable victim first and least valuable attacker first, then
+    the killer moves, each checked on its own, and only then are the other quiet moves generated.
+    :param hash_move: Move to try first as (start, end) squares, skipped if it is not a move of this position.
+    :param killers: Quiet moves to try before the other quiet moves, skipped if they are not moves of this position.
+    :param history: Dictionary of (start, end) move to score, quiet moves with a higher score are tried first.
+    :param quiets: False to yield only the hash move and the captures.
+    """
+        if hash_move is not None and self.is_pseudo_legal(hash_move):
+            yield hash_move
+
+        captures = []
+        for move in self.generate_captures():
+            if move != hash_move:
+                captures.append((CAPTURE_RANKS[self._mailbox[move[1]].get_piece_name()] * 8 -
+                                 CAPTURE_RANKS[self._mailbox[move[0]].get_piece_name()], move))
+        captures.sort(key=lambda capture: -capture[0])
+        for order, move in captures:
+            yield move
+        if not quiets:
+            return
+
+        killer_moves = []
+        for move in killers:
+            if move is not None and move != hash_move and move not in killer_moves and \
+                    self._mailbox[move[1]] is None and self.is_pseudo_legal(move):
+                killer_moves.append(move)
+                yield move
+
+        quiet_moves = [move for move in self.generate_moves()
+                       if self._mailbox[move[1]] is None and move != hash_move and move not in killer_moves]
+        if history:
+            quiet_moves.sort(key=lambda quiet: -history.get(quiet, 0))
+        yield from quiet_moves
+
+    def is_pseudo_legal(self, move):
+        """
+        Checks if a move can be made by a piece of the current player, ignoring whether it leaves its general in check.
+        Only the moves of the moving piece are generated, until the move is found.
+        :param move: Tuple of the start and end squares of the move.
+        :return: True if the move is a pseudo legal move of the current player.
+        """
+        piece = self._mailbox[move[0]]
+        if piece is None or piece.get_player() != self._player_turn:
+            return False
+        return move in piece.generate(self._mailbox)
+
+    def has_legal_move(self, player=None):
+        """
+        Checks if a player has any move that does not leave their general in check, stopping at the first one found.
+        :param player: 'red' or 'black', defaults to the current player.
+        :return: True if the player has a legal move.
+        """
+        if player is None:
+            player = self._player_turn
+        checked = self.in_check(player)
+        for move in self.generate_moves(player):
+            if self.is_legal_move(move, checked):
+                return True
+        return False
+
+    def legal_moves(self):
+        """
+        :return: List of the legal moves of the current player as (start, end) squares.
+        """
+        checked = self.in_check(self._player_turn)
+        return [move for move in self.generate_moves() if self.is_legal_move(move, checked)]
+
+    def is_legal_move(self, move, checked=None):
+        """
+        Checks that a pseudo legal move does not leave the general of the moving player in check, including by the
+        flying general rule. Most moves can't change that and are accepted without being made. Only a move that starts
+        on the row or column of the general or diagonally next to it, which may uncover a line or a horse leg, or that
+        ends on the row or column of the general, which may put a screen in front of a cannon, is made and tested,
+        as is every move of the general and every move while in check.
+        :param move: Tuple of the start and end squares of a pseudo legal move.
+        :param checked: Whether the moving player is in check now, found with in_check if None.
+        :return: True if the move is legal.
+        """
+        start, end = move
+        player = self._mailbox[start].get_player()
+        general_square = self._generals[player].get_square()
+        if checked is None:
+            checked = self.in_check(player)
+
+        general_row = SQUARE_ROWS[general_square]
+        general_column = SQUARE_COLUMNS[general_square]
+        if not checked and start != general_square and \
+                SQUARE_ROWS[start] != general_row and SQUARE_COLUMNS[start] != general_column and \
+                (abs(SQUARE_ROWS[start] - general_row) != 1 or abs(SQUARE_COLUMNS[start] - general_column) != 1) and \
+                SQUARE_ROWS[end] != general_row and SQUARE_COLUMNS[end] != general_column:
+            return True
+
+        # The trial push and pop leave the board as it was, so move pools that were current stay current.
+        pools_current = self._move_pool_current
+        self.push(move)
+        legal = not self.in_check(player)
+        self.pop()
+        self._move_pool_current = pools_current
+        return legal
+
+    def update_game_state(self):
+        """
+    Ends the game when the current player has no legal move. A checked player is checkmated and the other player wins,
+    otherwise the game is a STALEMATE, which the rules of Xiangqi also count as a loss for the player to move.
+    """
+        player = self._player_turn
+        if self.has_legal_move(player):
+            return
+        if self.in_check(player):
+            self.set_game_state('BLACK_WON' if player == 'red' else 'RED_WON')
+        else:
+            self.set_game_state('STALEMATE')
+
+    def in_check(self, player):
+        """
+        Checks if the general of a player can be captured by the other player, including by the flying general rule.
+        :param player: 'red' or 'black'.
+        :return: True if the general of the player is in check.
+        """
+        enemy = 'black' if player == 'red' else 'red'
+        return self.is_square_attacked(self._generals[player].get_square(), enemy)
+
+    def is_square_attacked(self, square, by_side):
+        """
+        Checks if a piece of a player could move to a square, looking outward from the square instead of generating
+        the player's moves. The straight lines are walked for a chariot, a cannon behind one screen, or a general on
+        the same column with nothing between, and the attack tables are looked up for the leaping pieces.
+        :param square: The square index 0 - 89.
+        :param by_side: The attacking player, 'red' or 'black'.
+        :return: True if the square is attacked by the player.
+        """
+        mailbox = self._mailbox
+        for direction, ray in enumerate(RAYS[square]):
+            screen_found = False
+            for position in ray:
+                piece = mailbox[position]
+                if piece is None:
+                    continue
+                if not screen_found:
+                    if piece.get_player() == by_side:
+                        name = piece.get_piece_name()
+                        # Only the two column rays, directions 0 and 1, can lead to a flying general.
+                        if name == 'CHARIOT' or (name == 'GENERAL' and direction < 2):
+                            return True
+                    screen_found = True
+                else:
+                    if piece.get_player() == by_side and piece.get_piece_name() == 'CANNON':
+                        return True
+                    break
+
+        for name in ('HORSE', 'SOLDIER', 'ADVISOR', 'ELEPHANT', 'GENERAL'):
+            for position, block in LEAPER_ATTACKS[(by_side, name)][square]:
+                piece = mailbox[position]
+                if piece is not None and piece.get_piece_name() == name and piece.get_player() == by_side and \
+                        (block is None or mailbox[block] is None):
+                    return True
+        return False
+
+    def update_move_pool_after_move(self, start, end):
+        """
+    Incrementally updates the move pools after a piece moved from start to end. Only the pieces whose moves can
+    depend on either square are regenerated.
+    :param start: The square the piece moved from.
+    :param end: The square the piece moved to.
+    """
+        affected = []
+        for i in self._active_pieces:
+            if self.piece_affected_by_square(i, start) or self.piece_affected_by_square(i, end):
+                affected.append(i)
+        self.update_move_pool(affected)
+
+    def piece_affected_by_square(self, piece, square):
+        """
+    Checks if a change of occupancy on a square can change the move pool of a piece. Chariots and cannons see along
+    their whole row and column. Every other piece only moves up to two rows or columns away and is blocked by legs
+    and eyes inside that range.
+    :param piece: The piece to check.
+    :param square: The square whose occupancy changed.
+    :return: True if the move pool of the piece must be regenerated.
+    """
+        row_distance = abs(SQUARE_ROWS[piece.get_square()] - SQUARE_ROWS[square])
+        column_distance = abs(SQUARE_COLUMNS[piece.get_square()] - SQUARE_COLUMNS[square])
+        if piece.get_piece_name() == 'CHARIOT' or piece.get_piece_name() == 'CANNON':
+            return row_distance == 0 or column_distance == 0
+        return row_distance <= 2 and column_distance <= 2
+
     def set_player_turn(self):
         """
         Change the current players turn.
@@ -195,113 +619,252 @@ class Xiangqi:
         # Verify start and end are within the board
         if self.verify_move_in_board_range(start) and self.verify_move_in_board_range(end):
 
+            start = SQUARE_INDEXES[start]
+            end = SQUARE_INDEXES[end]
+
             # Find the piece located in start
-            for i in self._active_pieces:
-                if i.get_piece_location() == start:
-                    piece = i
-                    break
+            piece = self._mailbox[start]
 
-            # Check to see that a piece is actually selected.
+            # Check to see that a piece of the current player is actually selected.
+            if piece is None or piece.get_player() != self.get_player_turn():
+                return False
 
-            # or piece.get_player() != self.get_player_turn()
-            if piece is None or end not in piece.get_legal_moves():
+            # Only the selected piece generates its moves, until the selected one is found. The move must not leave
+            # the player's own general in check.
+            if not self.is_pseudo_legal((start, end)) or not self.is_legal_move((start, end)):
                 return False
 
             # Check if there is piece at the end location.
-            for j in self._active_pieces:
-                if j != piece:
-                    if j.get_piece_location() == end:
-                        piece_2 = j
-                        break
-
-            # If there is a piece in end and it is an enemy piece take the piece location and move,
-            # otherwise return False.
-            if piece_2 is not None:
-                if piece_2.get_player() != piece.get_player():
-                    self._active_pieces.remove(piece_2)
-                    piece.set_current_location(end)
-                    self.update_move_pool(self._active_pieces)
-                    # self.set_player_turn()
-                    return True
-                else:
-                    return False
+            piece_2 = self._mailbox[end]
+
+            # If there is a piece in end it must be an enemy piece to be taken, otherwise return False.
+            if piece_2 is not None and piece_2.get_player() == piece.get_player():
+                return False
 
-            # If there is no piece in the current location and it is a legal move, move the piece.
+            # Move the piece, taking any enemy piece in the end location. Move pools that went stale while moves
+            # were pushed and popped are rebuilt in full.
+            pools_current = self._move_pool_current
+            self.push((start, end))
+            if pools_current:
+                self.update_move_pool_after_move(start, end)
             else:
-                piece.set_current_location(end)
                 self.update_move_pool(self._active_pieces)
-                # self.set_player_turn()
-                return True
+            self.update_game_state()
+            return True
         else:
             return False
 
+    def push(self, move):
+        """
+        Makes a move without checking that it is legal and passes the turn to the other player. Everything the move
+        changes is recorded on the undo stack so pop can take it back.
+        :param move: Tuple of the start and end squares of the move.
+        """
+        start, end = move
+        piece = self._mailbox[start]
+        captured = self._mailbox[end]
+        zobrist_key = self._zobrist_key
+
+        piece_keys = ZOBRIST_PIECE_KEYS[(piece.get_player(), piece.get_piece_name())]
+        self._zobrist_key ^= piece_keys[start] ^ piece_keys[end] ^ ZOBRIST_BLACK_TO_MOVE
+        score = self._score
+        piece_scores = SQUARE_SCORES[(piece.get_player(), piece.get_piece_name())]
+        if piece.get_player() == 'red':
+            self._score += piece_scores[end] - piece_scores[start]
+        else:
+            self._score -= piece_scores[end] - piece_scores[start]
+
+        captured_index = None
+        if captured is not None:
+            self._zobrist_key ^= ZOBRIST_PIECE_KEYS[(captured.get_player(), captured.get_piece_name())][end]
+            if captured.get_player() == 'red':
+                self._score -= SQUARE_SCORES[('red', captured.get_piece_name())][end]
+            else:
+                self._score += SQUARE_SCORES[('black', captured.get_piece_name())][end]
+            captured_index = self.capture_piece(captured)
+        self.move_piece_on_mailbox(piece, end)
+
+        red_general, black_general = self._generals['red'], self._generals['black']
+        self._undo_stack.append((start, end, captured, captured_index, self._game_state,
+                                 red_general.get_in_check(), black_general.get_in_check(), zobrist_key,
+                                 self._halfmove_clock, score))
+        self._halfmove_clock = 0 if captured is not None else self._halfmove_clock + 1
+        if self._player_turn == 'black':
+            self._fullmove_number += 1
+        self.set_player_turn()
+        self._move_pool_current = False
+
+    def pop(self):
+        """
+        Takes back the last move made with push, restoring the board, the player turn, the game state, the check
+        flags of the generals, the Zobrist key, the move counters and the score.
+        :return: Tuple of the start and end squares of the move taken back.
+        """
+        start, end, captured, captured_index, game_state, red_in_check, black_in_check, zobrist_key, \
+            halfmove_clock, score = self._undo_stack.pop()
+        self.move_piece_on_mailbox(self._mailbox[end], start)
+        if captured is not None:
+            self.restore_piece(captured, captured_index)
+
+        self._generals['red'].set_in_check(red_in_check)
+        self._generals['black'].set_in_check(black_in_check)
+        self._game_state = game_state
+        self._zobrist_key = zobrist_key
+        self._halfmove_clock = halfmove_clock
+        self._score = score
+        self.set_player_turn()
+        if self._player_turn == 'black':
+            self._fullmove_number -= 1
+        self._move_pool_current = False
+        return start, end
+
+    def get_undo_count(self):
+        """
+        :return: The number of moves made with push that pop can take back.
+        """
+        return len(self._undo_stack)
+
+    def get_backend(self):
+        """
+        :return: The move generator of the game, 'pieces' or 'bitboard'.
+        """
+        return 'pieces' if self._bitboards is None else 'bitboard'
+
+    def get_halfmove_clock(self):
+        """
+        :return: The number of moves made since the last capture.
+        """
+        return self._halfmove_clock
+
+    def get_fullmove_number(self):
+        """
+        :return: The number of the current full move, starting at 1.
+        """
+        return self._fullmove_number
+
+    def get_zobrist_key(self):
+        """
+        :return: The 64 bit Zobrist key of the current position and player turn.
+        """
+        return self._zobrist_key
+
+    def compute_zobrist_key(self):
+        """
+        Computes the Zobrist key of the current position from scratch. push and pop keep _zobrist_key up to date
+        without calling this.
+        :return: The 64 bit Zobrist key of the current position and player turn.
+        """
+        zobrist_key = 0
+        for i in self._active_pieces:
+            zobrist_key ^= ZOBRIST_PIECE_KEYS[(i.get_player(), i.get_piece_name())][i.get_square()]
+        if self._player_turn == 'black':
+            zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
+        return zobrist_key
+
+    def get_score(self):
+        """
+        :return: The material and piece-square score of the position in the point of view of the current player, the
+        same as evaluation.evaluate.
+        """
+        return self._score if self._player_turn == 'red' else -self._score
+
+    def compute_score(self):
+        """
+        Computes the material and piece-square score from scratch. push and pop keep _score up to date without
+        calling this.
+        :return: The score of red minus the score of black.
+        """
+        score = 0
+        for i in self._active_pieces:
+            if i.get_player() == 'red':
+                score += SQUARE_SCORES[('red', i.get_piece_name())][i.get_square()]
+            else:
+                score -= SQUARE_SCORES[('black', i.get_piece_name())][i.get_square()]
+        return score
+
+    def get_repetition_count(self):
+        """
+        Counts how many times the current position occurred earlier among the moves on the undo stack, with the same
+        player to move.
+        :return: The number of earlier occurrences of the current position.
+        """
+        return sum(1 for record in self._undo_stack if record[7] == self._zobrist_key)
+
+    def move_piece_on_mailbox(self, piece, end):
+        """
+        Moves a piece to the end square, keeping the mailbox in sync with the piece. Any piece previously
+        standing on end is overwritten, so captures must be removed from _active_pieces by the caller.
+        :param piece: The piece to move.
+        :param end: The square index to move the piece to.
+        """
+        if self._bitboards is not None:
+            self._bitboards.move_piece(piece.get_player(), piece.get_piece_name(), piece.get_square(), end)
+        self._mailbox[piece.get_square()] = None
+        self._mailbox[end] = piece
+        piece.set_square(end)
+
+    def capture_piece(self, piece):
+        """
+        Takes a captured piece off the board. Its square is left to the capturing piece to overwrite. The last active
+        piece is moved into the captured piece's place in _active_pieces, and every piece records its own index, so
+        the removal takes constant time.
+        :param piece: The piece being captured.
+        :return: The index the captured piece had in _active_pieces, for restore_piece.
+        """
+        index = piece.get_active_index()
+        last_piece = self._active_pieces.pop()
+        if index < len(self._active_pieces):
+            self._active_pieces[index] = last_piece
+            last_piece.set_active_index(index)
+        if self._bitboards is not None:
+            self._bitboards.remove_piece(piece.get_player(), piece.get_piece_name(), piece.get_square())
+        return index
+
+    def restore_piece(self, piece, index):
+        """
+        Puts a captured piece back on its square and at its old index in _active_pieces.
+        :param piece: The piece to put back.
+        :param index: The index returned by capture_piece.
+        """
+        if index < len(self._active_pieces):
+            moved_piece = self._active_pieces[index]
+            moved_piece.set_active_index(len(self._active_pieces))
+            self._active_pieces.append(moved_piece)
+            self._active_pieces[index] = piece
+        else:
+            self._active_pieces.append(piece)
+        piece.set_active_index(index)
+        self._mailbox[piece.get_square()] = piece
+        if self._bitboards is not None:
+            self._bitboards.add_piece(piece.get_player(), piece.get_piece_name(), piece.get_square())
+
     def verify_move_in_board_range(self, location):
         """
         Check to see if the alphanumeric location is within the board.
         :param location: The board location to check.
         :return: True or False depending on if the location is on the board.
         """
-        in_bounds = False
-        for i in self._board:
-            if location in i:
-                in_bounds = True
-                break
-        return in_bounds
-
-    def give_general_check_status(self, piece_list):
-        for i in piece_list:
-            if i.get_piece_name() == 'GENERAL':
-               print(str(i.get_player()) + str(i.get_in_check()))
+        return location in SQUARE_INDEXES
 
     def general_cant_move_here(self, generals, piece_list):
-        red_general, black_general = generals
-
-        for i in piece_list:
-            if i.get_player() == 'black':
-                for k in i.get_legal_moves():
-                    if k in red_general.get_legal_moves():
-                        red_general.delete_move(k)
-            elif i.get_player() == 'red':
-                for j in i.get_legal_moves():
-                    if j in black_general.get_legal_moves():
-                        red_general.delete_move(j)
+        """
+    Removes the squares attacked by the enemy from the move pools of the generals. Each general is lifted off the board
+    while its squares are checked, so it can't hide behind itself on a line it is attacked along.
+    """
+        for general in generals:
+            enemy = 'black' if general.get_player() == 'red' else 'red'
+            square = general.get_square()
+            self._mailbox[square] = None
+            for end in list(general.get_legal_squares()):
+                if self.is_square_attacked(end, enemy):
+                    general.delete_move(end)
+            self._mailbox[square] = general
 
     def is_general_in_check(self, generals, piece_list):
         red_general, black_general = generals
 
-        black_moves = set()
-        red_moves = set()
-        for j in piece_list:
-            if j.get_piece_name() != 'GENERAL':
-                if j.get_player() == 'black':
-                    for k in j.get_legal_moves():
-                        black_moves.add(k)
-                elif j.get_player() == 'red':
-                    for k in j.get_legal_moves():
-                        red_moves.add(k)
-
-        if red_general.get_piece_location() in black_moves:
-            red_general.set_in_check(True)
-            self.verify_general_in_check_mate(red_general, piece_list)
-        else:
-            red_general.set_in_check(False)
-        if black_general.get_piece_location() in red_moves:
-            black_general.set_in_check(True)
-            self.verify_general_in_check_mate(black_general, piece_list)
-        else:
-            black_general.set_in_check(False)
-
-    def verify_general_in_check_mate(self, general, piece_list):
-
-        if self.get_game_state() != 'UNFINISHED':
-            print("Game not in unfinished state")
-            return False
-
-        if len(general.get_legal_moves()) >= 1:
-            print("red_general not check mate")
-        else:
-            self.verify_friendly_forces_moves(general, piece_list)
-            self.verify_enemy_attack(general, piece_list)
+        red_general.set_in_check(self.is_square_attacked(red_general.get_square(), 'black'))
+        black_general.set_in_check(self.is_square_attacked(black_general.get_square(), 'red'))
 
     def find_generals(self, piece_list):
 
@@ -316,64 +879,6 @@ class Xiangqi:
 
         return red_general, black_general
 
-    def verify_friendly_forces_moves(self, piece, piece_list):
-
-        friendly_moves = set()
-        for i in piece_list:
-            if i.get_player() == piece.get_player():
-                for k in i.get_legal_moves():
-                    friendly_moves.add(k)
-        return friendly_moves
-
-    def verify_enemy_attack(self, piece, piece_list):
-
-        enemy_location = None
-        enemy_count = 0
-        enemy_piece = None
-        for i in piece_list:
-            if i.get_player() != piece.get_player():
-                if piece.get_piece_location() in i.get_legal_moves():
-                    enemy_piece = i
-                    enemy_location = None
-                    enemy_count += 1
-
-        print(enemy_location)
-        print(enemy_count)
-        print(enemy_piece)
-
-        if enemy_count == 0:
-            return False
-        elif enemy_count > 1:
-            if piece.get_player() == 'red':
-                self.set_game_state('BLACK_WON')
-                return False
-            else:
-                self.set_game_state('RED_WON')
-                return False
-        else:
-            # Check if enemy piece can be taken.
-            for j in piece_list:
-                if j.get_player() == piece.get_player():
-                    if enemy_location in j.get_legal_moves():
-                        return j
-
-            # Check if enemy piece can be blocked.
-            if enemy_piece.get_piece_name == 'ELEPHANT':
-                enemy_piece.general_to_elephant(piece, enemy_piece, self.get_game_board())
-                print("worked")
-
-        print(enemy_location)
-        print(enemy_count)
-        print(enemy_piece)
-
-    def general_to_horse(self, general, enemy):
-        pass
-    def general_to_chariot(self, general, enemy):
-        pass
-    def general_to_cannon(self, general, enemy):
-        pass
-    def general_to_soldier(self, general, enemy):
-        pass
 
 
 # GAME PIECES
@@ -382,33 +887,41 @@ class Pieces:
   Major methods of game pieces.
 
   :items:
-  _current_location - Stored alphanumerical reference to the pieces current location on the board.
-  _legal_moves - List of all possible moves a piece can make.
+  _square - Stored integer square, 0 - 89, of the pieces current location on the board.
+  _legal_moves - List of the squares of all possible moves a piece can make.
   _player - Player color that owns a particular piece.
-  _name - Name of the piece.
+  _name - Name of the piece, a class attribute set by each subclass.
 
   :methods:
   get_player - Returns color of player who owns the piece.
   set_player - Sets the ownership color of the piece.
   get_piece_name - Returns the name of the piece.
-  get_piece_location - Returns the current location of a piece.
-  set_current_location - Adds the selected location to the pieces current location.
-  get_legal_moves - Returns the pool of legal moves of a piece.
+  get_piece_location - Returns the current alphanumeric location of a piece.
+  set_current_location - Adds the selected alphanumeric location to the pieces current location.
+  get_square - Returns the current square of a piece.
+  set_square - Sets the current square of a piece.
+  get_active_index - Returns the index of a piece in the active piece list of its game.
+  set_active_index - Sets the index of a piece in the active piece list of its game.
+  get_legal_moves - Returns the pool of legal moves of a piece as alphanumeric locations.
+  get_legal_squares - Returns the pool of legal moves of a piece as squares.
   clear_piece_move_pool - Empties the move pool of a particular piece.
   add_move_to_pool - Adds a legal move to the pieces move pool.
   delete_move - Removes a selected move from a pieces legal move pool.
-  get_indexes_of_location - Get the numerical indexes of a location from the board.
-  verify_if_potential_piece - Checks to see if a selected location is the location of a piece.
-  potential_movement - Checks to see if a selected location is possible for the current piece.
-  general_and_advisor_movement_pool_check - Ensures that the advisors and general can only select legal movements
-                                            from the correct pool.
+  set_move_pool - Replaces the move pool of a piece.
+  generate - Yields the moves of the piece on a board, each subclass moves in its own way.
+  generate_captures - Yields only the captures of the piece, the chariot and cannon look at the ends of their lines.
+  table_moves - Yields the unblocked moves of a precomputed move table entry.
   """
 
+    # Pieces have no __dict__, which keeps the many pieces held during a search small.
+    __slots__ = ('_square', '_legal_moves', '_player', '_active_index')
+    _name = None
+
     def __init__(self):
-        self._current_location = None
+        self._square = None
         self._legal_moves = []
         self._player = None
-        self._name = None
+        self._active_index = None
 
     def set_player(self, player):
         """Set piece to color of player"""
@@ -423,83 +936,85 @@ class Pieces:
         return self._name
 
     def set_current_location(self, location):
-        """Changes a pieces current location to the selected location."""
-        self._current_location = location
+        """Changes a pieces current location to the selected alphanumeric location."""
+        self._square = SQUARE_INDEXES[location]
 
     def get_piece_location(self):
         """Get alpha numeric location of piece."""
-        return self._current_location
+        if self._square is None:
+            return None
+        return SQUARE_NAMES[self._square]
+
+    def set_square(self, square):
+        """Changes a pieces current location to the selected square."""
+        self._square = square
+
+    def get_square(self):
+        """Get the square of the piece."""
+        return self._square
+
+    def set_active_index(self, index):
+        """Records the index of the piece in the active piece list of its game."""
+        self._active_index = index
+
+    def get_active_index(self):
+        """Get the index of the piece in the active piece list of its game."""
+        return self._active_index
 
     def get_legal_moves(self):
-        """Get the current pool of legal moves that a piece can move to."""
+        """Get the current pool of legal moves that a piece can move to as alphanumeric locations."""
+        return [SQUARE_NAMES[i] for i in self._legal_moves]
+
+    def get_legal_squares(self):
+        """Get the current pool of legal moves that a piece can move to as squares."""
         return self._legal_moves
 
+    def set_move_pool(self, squares):
+        """Replaces the move pool with a list of squares."""
+        self._legal_moves = squares
+
     def clear_piece_move_pool(self):
         """Resets current move pool to zero."""
         self._legal_moves = []
 
     def add_move_to_pool(self, move):
-        """Add a selected alpha numeric location to the pieces move pool."""
+        """Add a selected square to the pieces move pool."""
         self._legal_moves.append(move)
 
     def delete_move(self, move):
-        """Deletes the selected move from the move pool."""
+        """Deletes the selected square from the move pool."""
         self._legal_moves.remove(move)
 
-    def get_indexes_of_location(self, piece, board):
+    def generate(self, mailbox):
         """
-        Returns the index values of the piece on the board.
-        :param piece: The alphanumerical piece location.
-        :param board: The reference board.
-        :return: The index number of the column and the index number of the row.
+        Yields the pseudo legal moves of the piece as (start, end) squares. Every kind of piece overrides this.
+        :param mailbox: 90 entry list of the current active pieces, None where a square is empty.
         """
-        for i in board:
-            for t in i:
-                if piece.get_piece_location() == t:
-                    index_column = i.index(t)
-                    index_row = board.index(i)
-        return index_column, index_row
+        raise NotImplementedError
 
-    def verify_if_potential_piece(self, location, piece_list):
+    def generate_captures(self, mailbox):
         """
-        Checks if there is a piece from the list in the current location
-        location - the alphanumeric area of the board
-        piece_list - list of current active pieces
+        Yields the moves of generate that land on an enemy piece. The leaping pieces use this, the chariot and cannon
+        override it to look only at the pieces at the ends of their lines.
+        :param mailbox: 90 entry list of the current active pieces, None where a square is empty.
         """
-        potential_piece = None
-        for i in piece_list:
-            if i.get_piece_location() == location:
-                potential_piece = i
-                break
-        return potential_piece
+        for move in self.generate(mailbox):
+            if mailbox[move[1]] is not None:
+                yield move
 
-    def potential_movement(self, index_row, index_column, row, column, board):
+    def table_moves(self, moves, mailbox):
         """
-        Checks to see if the desired movement is possible.
-        :param index_row: The index of the row of the current piece.
-        :param index_column: The index of the column of the current piece.
-        :param row: The + or - offset of the row that a piece wants to move.
-        :param column: The + or - offset of the column that a piece wants to move.
-        :param board: The board for reference of a legal move.
-        :return: Either none or the alphanumeric location of the move on the board.
+        Yields the moves from a precomputed move table entry of the piece as (start, end) squares.
+        :param moves: Tuple of (destination, block) squares, block is None if the move can't be blocked.
+        :param mailbox: The list of current active pieces for reference.
         """
-        if (index_row + row) in range(0, 10) and (index_column + column) in range(0, 10):
-            move = board[index_row + row][index_column + column]
-            return move
-        else:
-            return None
-
-    def general_and_advisor_movement_pool_check(self, piece):
-        """
-        Movement pool used for GENERAL and ADVISOR as they must stay in the 'castle'
-        :param piece: Piece to check for player ownership
-        :return: move_pool of the selected piece
-        """
-        if piece.get_player() == 'red':
-            move_pool = ['d1', 'd2', 'd3', 'e1', 'e2', 'e3', 'f1', 'f2', 'f3']
-        else:
-            move_pool = ['d8', 'd9', 'd10', 'e8', 'e9', 'e10', 'f8', 'f9', 'f10']
-        return move_pool
+        start = self._square
+        for position, block in moves:
+            if block is not None and mailbox[block] is not None:
+                continue
+            occupant = mailbox[position]
+            if occupant is None or occupant._player != self._player:
+                yield start, position
 
 
 class General(Pieces):
@@ -509,9 +1024,11 @@ class General(Pieces):
   Generals can only move in the confines of the castle, in any direction orthoganally.
   """
 
+    __slots__ = ('_in_check',)
+    _name = 'GENERAL'
+
     def __init__(self):
         super().__init__()
-        self._name = 'GENERAL'
         self._in_check = False
 
     def set_in_check(self, status):
@@ -520,57 +1037,13 @@ class General(Pieces):
     def get_in_check(self):
         return self._in_check
 
-    def general_legal_moves(self, piece, board, piece_list):
+    def generate(self, mailbox):
         """
-    Will check the board for all of the General's legal moves and add them to the reference pool
-    :param piece: Piece to update move pool for.
-    :param board: Reference of the board.
-    :param piece_list: The list of current active pieces for reference.
+    Will check the board for all of the General's moves.
+    :param mailbox: The grid of current active pieces for reference.
     """
-        piece.clear_piece_move_pool()  # Clear move pool.
-
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
-        # Picks correct move pool for the given General piece
-        movement_pool = self.general_and_advisor_movement_pool_check(piece)
-
-        # General can move only orthogonally. This will add each legal orthogonal move to the legal move pool.
-        try:
-            # Upward one row of the board, same column.
-            position = self.potential_movement(index_row, index_column, -1, 0, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Down one row of the board, same column.
-            position = self.potential_movement(index_row, index_column, +1, 0, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Left one column on the board, same row.
-            position = self.potential_movement(index_row, index_column, 0, -1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Right one column of the board, same row.
-            position = self.potential_movement(index_row, index_column, 0, +1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
+        # General can move only orthogonally, one step inside the castle.
+        return self.table_moves(GENERAL_MOVES[self._player][self._square], mailbox)
 
 
 class Advisor(Pieces):
@@ -578,549 +1051,131 @@ class Advisor(Pieces):
   Advisors guard the General in the castle. They can move one space any direction diagonally.
   """
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'ADVISOR'
-
-    def advisor_legal_moves(self, piece, board, piece_list):
-
-        piece.clear_piece_move_pool()  # Clear move pool.
-
-        # Each General can not leave a specific square. This is all the potential moves that a General could make in the
-        # confines of the square.
-
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
-
-        # Advisor can move only diagonally in one direction.
-        movement_pool = self.general_and_advisor_movement_pool_check(piece)
-
-        # This will add each legal diagonal move to the legal move pool.
-        try:
-            # Up left
-            position = self.potential_movement(index_row, index_column, -1, -1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Up right
-            position = self.potential_movement(index_row, index_column, -1, +1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Down left
-            position = self.potential_movement(index_row, index_column, +1, -1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
-        try:
-            # Down right
-            position = self.potential_movement(index_row, index_column, +1, +1, board)
-            if position in movement_pool and self.verify_if_potential_piece(position, piece_list) is None:
-                piece.add_move_to_pool(position)
-            elif position in movement_pool and self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                piece.add_move_to_pool(position)
-        except:
-            pass
+    __slots__ = ()
+    _name = 'ADVISOR'
 
+    def generate(self, mailbox):
 
-class Elephant(Pieces):
+        # Advisor can move only diagonally one space, inside the castle.
+        return self.table_moves(ADVISOR_MOVES[self._player][self._square], mailbox)
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'ELEPHANT'
-
-    def elephant_legal_moves(self, piece, board, piece_list):
-
-        piece.clear_piece_move_pool()  # Clear move pool.
-
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
-
-        # Up left
-        try:
-            position = self.potential_movement(index_row, index_column, -1, -1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                position = self.potential_movement(index_row, index_column, -2, -2, board)
-                if self.verify_if_potential_piece(position, piece_list) is None or self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position)
-        except:
-            pass
-        # Up - right
-        try:
-            position = self.potential_movement(index_row, index_column, -1, +1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                position = self.potential_movement(index_row, index_column, -2, +2, board)
-                if self.verify_if_potential_piece(position, piece_list) is None or self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position)
-        except:
-            pass
-
-        # Down - left
-        try:
-            position = self.potential_movement(index_row, index_column, +1, -1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                position = self.potential_movement(index_row, index_column, +2, -2, board)
-                if self.verify_if_potential_piece(position, piece_list) is None or self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position)
-        except:
-            pass
-
-        # Down - right
-        try:
-            position = self.potential_movement(index_row, index_column, +1, +1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                position = self.potential_movement(index_row, index_column, +2, +2, board)
-                if self.verify_if_potential_piece(position, piece_list) is None or self.verify_if_potential_piece(position, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position)
-        except:
-            pass
-
-    def general_to_elephant(self, piece, enemy, board):
-        enemy_block = None
-        enemy_index_column, enemy_index_row = self.get_indexes_of_location(enemy, board)
-        general_index_column, general_index_row = self.get_indexes_of_location(piece, board)
-
-        try:
-            position = Pieces.potential_movement(enemy_index_row, enemy_index_column, enemy_index_row - general_index_row, enemy_index_column - general_index_row, board)
-            enemy_block = position
-        except:
-            print("nope")
-            pass
-
-        return enemy_block
 
+class Elephant(Pieces):
 
-class Horse(Pieces):
+    __slots__ = ()
+    _name = 'ELEPHANT'
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'HORSE'
-
-    def horse_legal_moves(self, piece, board, piece_list):
-
-        piece.clear_piece_move_pool()  # Clear move pool.
-
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
-
-        # Check on the Horse legal moves
-
-        # Left - up (left 2 up 1)
-        try:
-            position = self.potential_movement(index_row, index_column, 0, -1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                #left up
-                position_2 = self.potential_movement(index_row, index_column, -1, -2, board)
-                #left down
-                position_3 = self.potential_movement(index_row, index_column, +1, -2, board)
-                if self.verify_if_potential_piece(position_2, piece_list) is None or self.verify_if_potential_piece(position_2, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_2)
-                if self.verify_if_potential_piece(position_3, piece_list) is None or self.verify_if_potential_piece(position_3, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_3)
-        except:
-            pass
-
-        # Up - left (up 2 left 1)
-        try:
-            position = self.potential_movement(index_row, index_column, -1, 0, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                # up left
-                position_2 = self.potential_movement(index_row, index_column, -2, -1, board)
-                # up right
-                position_3 = self.potential_movement(index_row, index_column, -2, +1, board)
-                if self.verify_if_potential_piece(position_2, piece_list) is None or self.verify_if_potential_piece(position_2, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_2)
-                if self.verify_if_potential_piece(position_3, piece_list) is None or self.verify_if_potential_piece(position_3, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_3)
-        except:
-            pass
-        # right - up (right 2 up 1)
-        try:
-            position = self.potential_movement(index_row, index_column, 0, +1, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                # right up
-                position_2 = self.potential_movement(index_row, index_column, -1, +2, board)
-                # right down
-                position_3 = self.potential_movement(index_row, index_column, +1, +2, board)
-                if self.verify_if_potential_piece(position_2, piece_list) is None or self.verify_if_potential_piece(position_2, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_2)
-                if self.verify_if_potential_piece(position_3, piece_list) is None or self.verify_if_potential_piece(position_3, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_3)
-        except:
-            pass
-        # down - left (down 2 left 1)
-        try:
-            position = self.potential_movement(index_row, index_column, +1, 0, board)
-            if self.verify_if_potential_piece(position, piece_list) is None and position is not None:
-                # down left
-                position_2 = self.potential_movement(index_row, index_column, +2, -1, board)
-                # down right
-                position_3 = self.potential_movement(index_row, index_column, +2, +1, board)
-                if self.verify_if_potential_piece(position_2, piece_list) is None or self.verify_if_potential_piece(position_2, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_2)
-                if self.verify_if_potential_piece(position_3, piece_list) is None or self.verify_if_potential_piece(position_3, piece_list).get_player() != piece.get_player():
-                    piece.add_move_to_pool(position_3)
-        except:
-            pass
+    def generate(self, mailbox):
 
+        # Elephant moves two spaces diagonally unless the eye between is occupied, and never crosses the river.
+        return self.table_moves(ELEPHANT_MOVES[self._player][self._square], mailbox)
 
-class Chariot(Pieces):
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'CHARIOT'
+class Horse(Pieces):
 
-    def chariot_legal_moves(self, piece, board, piece_list):
+    __slots__ = ()
+    _name = 'HORSE'
 
-        piece.clear_piece_move_pool()  # Clear move pool.
+    def generate(self, mailbox):
 
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
+        # Horse moves one space orthogonally then one diagonally outward, unless the leg it steps over is occupied.
+        return self.table_moves(HORSE_MOVES[self._square], mailbox)
 
-        red_move_pool = []
-        black_move_pool = []
 
-        for x in piece_list:
-            if x.get_player() == 'red':
-                red_move_pool.append(x.get_piece_location())
-            else:
-                black_move_pool.append(x.get_piece_location())
-
-        # Down column
-        try:
-            i = 1
-            index_break = False
-            while index_row + i < 10 and index_break is False:
-                a = board[index_row + i][index_column]
-                if a in red_move_pool and piece.get_player() == 'red':
-                    index_break = True
-                elif a in black_move_pool and piece.get_player() == 'black':
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-        except:
-            pass
-
-        # Up column
-        try:
-            i = 1
-            index_break = False
-            while index_row - i >= 0 and index_break is False:
-                a = board[index_row - i][index_column]
-                if a in red_move_pool and piece.get_player() == 'red':
-                    index_break = True
-                elif a in black_move_pool and piece.get_player() == 'black':
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-        except:
-            pass
-
-        # Left row
-        try:
-            i = 1
-            index_break = False
-            while index_column - i >= 0 and index_break is False:
-                a = board[index_row][index_column - i]
-                if a in red_move_pool and piece.get_player() == 'red':
-                    index_break = True
-                elif a in black_move_pool and piece.get_player() == 'black':
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-        except:
-            pass
-
-        # Right
-        try:
-            i = 1
-            index_break = False
-            while index_column + i < 10 and index_break is False:
-                a = board[index_row][index_column + i]
-                if a in red_move_pool and piece.get_player() == 'red':
-                    index_break = True
-                elif a in black_move_pool and piece.get_player() == 'black':
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-        except:
-            pass
+class Chariot(Pieces):
 
+    __slots__ = ()
+    _name = 'CHARIOT'
+
+    def generate(self, mailbox):
+
+        # Up column, down column, left row and right row. The chariot slides until it reaches the edge of the board
+        # or another piece, which it may capture if it belongs to the enemy.
+        start = self._square
+        for ray in RAYS[start]:
+            for square in ray:
+                occupant = mailbox[square]
+                if occupant is None:
+                    yield start, square
+                    continue
+                if occupant._player != self._player:
+                    yield start, square
+                break
 
-class Cannon(Pieces):
+    def generate_captures(self, mailbox):
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'CANNON'
+        # Only the first piece along each line can be captured.
+        start = self._square
+        for ray in RAYS[start]:
+            for square in ray:
+                occupant = mailbox[square]
+                if occupant is not None:
+                    if occupant._player != self._player:
+                        yield start, square
+                    break
 
-    def cannon_legal_moves(self, piece, board, piece_list):
-        piece.clear_piece_move_pool()  # Clear move pool.
 
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
+class Cannon(Pieces):
 
-        red_move_pool = []
-        black_move_pool = []
+    __slots__ = ()
+    _name = 'CANNON'
+
+    def generate(self, mailbox):
+
+        # Up column, down column, left row and right row. The cannon slides like a chariot but can only capture by
+        # jumping over exactly one piece, the screen, to the first piece beyond it.
+        start = self._square
+        for ray in RAYS[start]:
+            screen_found = False
+            for square in ray:
+                occupant = mailbox[square]
+                if not screen_found:
+                    if occupant is None:
+                        yield start, square
+                    else:
+                        screen_found = True
+                elif occupant is not None:
+                    if occupant._player != self._player:
+                        yield start, square
+                    break
 
-        for x in piece_list:
-            if x != piece:
-                if x.get_player() == 'red':
-                    red_move_pool.append(x.get_piece_location())
-                else:
-                    black_move_pool.append(x.get_piece_location())
-
-        # Down column
-        try:
-            i = 1
-            index_break = False
-            jump_move = None
-            while index_row + i < 10 and index_break is False:
-                a = board[index_row + i][index_column]
-                if a in red_move_pool or a in black_move_pool:
-                    for b in piece_list:
-                        if b.get_piece_location() == a:
-                            jump_move = b
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-
-            try:
-                if jump_move is not None:
-                    jump_index_column, jump_index_row = self.get_indexes_of_location(jump_move, board)
-
-                    c = 1
-                    jump_index_break = False
-                    while jump_index_row + c < 10 and jump_index_break is False:
-                        d = board[jump_index_row + c][jump_index_column]
-                        if d in red_move_pool and piece.get_player() == 'red':
-                            jump_index_break = True
-                        elif d in black_move_pool and piece.get_player() == 'black':
-                            jump_index_break = True
-                        else:
-                            for e in piece_list:
-                                if d == e.get_piece_location():
-                                    if e.get_player() != piece.get_player():
-                                        piece.add_move_to_pool(d)
-                                        jump_index_break = True
-                            c += 1
-            except:
-                pass
-
-        except:
-            pass
-
-        # Up column
-        try:
-            i = 1
-            index_break = False
-            jump_move = None
-            while index_row - i >= 0 and index_break is False:
-                a = board[index_row - i][index_column]
-                if a in red_move_pool or a in black_move_pool:
-                    for b in piece_list:
-                        if b.get_piece_location() == a:
-                            jump_move = b
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-
-            try:
-                if jump_move is not None:
-                    jump_index_column, jump_index_row = self.get_indexes_of_location(jump_move, board)
-
-                    c = 1
-                    jump_index_break = False
-                    while jump_index_row - c < 10 and jump_index_break is False:
-                        d = board[jump_index_row - c][jump_index_column]
-                        if d in red_move_pool and piece.get_player() == 'red':
-                            jump_index_break = True
-                        elif d in black_move_pool and piece.get_player() == 'black':
-                            jump_index_break = True
-                        else:
-                            for e in piece_list:
-                                if d == e.get_piece_location():
-                                    if e.get_player() != piece.get_player():
-                                        piece.add_move_to_pool(d)
-                                        jump_index_break = True
-                            c += 1
-            except:
-                pass
-
-        except:
-            pass
-
-        # # Left row
-        try:
-            i = 1
-            index_break = False
-            jump_move = None
-            while index_column - i >= 0 and index_break is False:
-                a = board[index_row][index_column - i]
-                if a in red_move_pool or a in black_move_pool:
-                    for b in piece_list:
-                        if b.get_piece_location() == a:
-                            jump_move = b
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-
-            try:
-                if jump_move is not None:
-                    jump_index_column, jump_index_row = self.get_indexes_of_location(jump_move, board)
-
-                    c = 1
-                    jump_index_break = False
-                    while jump_index_column - c >= 0 and jump_index_break is False:
-                        d = board[jump_index_row][jump_index_column - c]
-                        if d in red_move_pool and piece.get_player() == 'red':
-                            jump_index_break = True
-                        elif d in black_move_pool and piece.get_player() == 'black':
-                            jump_index_break = True
-                        else:
-                            for e in piece_list:
-                                if d == e.get_piece_location():
-                                    if e.get_player() != piece.get_player():
-                                        piece.add_move_to_pool(d)
-                                        jump_index_break = True
-                            c += 1
-            except:
-                pass
-
-        except:
-            pass
-
-        # Right Row
-        try:
-            i = 1
-            index_break = False
-            jump_move = None
-            while index_column + i < 10 and index_break is False:
-                a = board[index_row][index_column + i]
-                if a in red_move_pool or a in black_move_pool:
-                    for b in piece_list:
-                        if b.get_piece_location() == a:
-                            jump_move = b
-                    index_break = True
-                else:
-                    piece.add_move_to_pool(a)
-                    i += 1
-
-            try:
-                if jump_move is not None:
-                    jump_index_column, jump_index_row = self.get_indexes_of_location(jump_move, board)
-
-                    c = 1
-                    jump_index_break = False
-                    while jump_index_column + c < 10 and jump_index_break is False:
-                        d = board[jump_index_row][jump_index_column + c]
-                        if d in red_move_pool and piece.get_player() == 'red':
-                            jump_index_break = True
-                        elif d in black_move_pool and piece.get_player() == 'black':
-                            jump_index_break = True
-                        else:
-                            for e in piece_list:
-                                if d == e.get_piece_location():
-                                    if e.get_player() != piece.get_player():
-                                        piece.add_move_to_pool(d)
-                                        jump_index_break = True
-                            c += 1
-            except:
-                pass
-
-        except:
-            pass
+    def generate_captures(self, mailbox):
+
+        # Only the first piece beyond the screen along each line can be captured.
+        start = self._square
+        for ray in RAYS[start]:
+            screen_found = False
+            for square in ray:
+                occupant = mailbox[square]
+                if occupant is None:
+                    continue
+                if screen_found:
+                    if occupant._player != self._player:
+                        yield start, square
+                    break
+                screen_found = True
 
 
 class Soldier(Pieces):
 
-    def __init__(self):
-        super().__init__()
-        self._name = 'SOLDIER'
+    __slots__ = ()
+    _name = 'SOLDIER'
 
-    def soldier_legal_moves(self, piece, board, piece_list):
-        piece.clear_piece_move_pool()  # Clear move pool.
+    def generate(self, mailbox):
 
-        # Set the index for row and column to the pieces current location for reference.
-        index_column, index_row = self.get_indexes_of_location(piece, board)
+        # Soldiers step forward, and sideways as well once they have crossed the river.
+        return self.table_moves(SOLDIER_MOVES[self._player][self._square], mailbox)
 
-        river_flag = piece.get_piece_location()
-        river_flag = str(river_flag)[1:]
 
-        if piece.get_player() == 'red':
-            if int(river_flag) >= 6:
-                try:
-                    a = board[index_row + 1][index_column]
-                    b = board[index_row][index_column - 1]
-                    c = board[index_row][index_column + 1]
-                    piece.add_move_to_pool(a)
-                    piece.add_move_to_pool(b)
-                    piece.add_move_to_pool(c)
-                    for i in piece_list:
-                        if i.get_piece_location() in piece.get_legal_moves():
-                            if i.get_piece_location() == a and i.get_player() == piece.get_player():
-                                piece.delete_move(a)
-                            if i.get_piece_location() == b and i.get_player() == piece.get_player():
-                                piece.delete_move(b)
-                            if i.get_piece_location() == c and i.get_player() == piece.get_player():
-                                piece.delete_move(c)
-                except:
-                    pass
-            else:
-                try:
-                    a = board[index_row + 1][index_column]
-                    piece.add_move_to_pool(a)
-                    for j in piece_list:
-                        if j.get_piece_location() == a and j.get_player() == piece.get_player():
-                            piece.delete_move(a)
-                except:
-                    pass
+# Piece class of each name of PIECE_NAMES, in the same order.
+PIECE_CLASSES = (General, Advisor, Elephant, Horse, Chariot, Cannon, Soldier)
 
-        else:
-            if int(river_flag) <= 5:
-                try:
-                    a = board[index_row - 1][index_column]
-                    b = board[index_row][index_column - 1]
-                    c = board[index_row][index_column + 1]
-                    piece.add_move_to_pool(a)
-                    piece.add_move_to_pool(b)
-                    piece.add_move_to_pool(c)
-                    for i in piece_list:
-                        if i.get_piece_location() in piece.get_legal_moves():
-                            if i.get_piece_location() == a and i.get_player() == piece.get_player():
-                                piece.delete_move(a)
-                            if i.get_piece_location() == b and i.get_player() == piece.get_player():
-                                piece.delete_move(b)
-                            if i.get_piece_location() == c and i.get_player() == piece.get_player():
-                                piece.delete_move(c)
-                except:
-                    pass
-            else:
-                try:
-                    a = board[index_row - 1][index_column]
-                    piece.add_move_to_pool(a)
-                    for j in piece_list:
-                        if j.get_piece_location() == a and j.get_player() == piece.get_player():
-                            piece.delete_move(a)
-                except:
-                    pass
+# Piece classes and letters of Xiangqi FEN, see Xiangqi.from_fen. E and H are accepted for the elephant and horse.
+FEN_PIECES = {'K': General, 'A': Advisor, 'B': Elephant, 'E': Elephant, 'N': Horse, 'H': Horse, 'R': Chariot,
+              'C': Cannon, 'P': Soldier}
+FEN_LETTERS = {'GENERAL': 'K', 'ADVISOR': 'A', 'ELEPHANT': 'B', 'HORSE': 'N', 'CHARIOT': 'R', 'CANNON': 'C',
+               'SOLDIER': 'P'}
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1"
 
 
 def NewGame():
@@ -1136,7 +1191,7 @@ def NewGame():
     red_general.set_current_location('e1')
     new_game.append(red_general)
 
-    red_advisor_left = Pieces.Advisor()
+    red_advisor_left = Advisor()
     red_advisor_left.set_player('red')
     red_advisor_left.set_current_location('d1')
     new_game.append(red_advisor_left)
@@ -1147,7 +1202,7 @@ def NewGame():
     new_game.append(red_advisor_right)
 
     red_elephant_left = Elephant()
-    red_elephant_left.set_player('black')
+    red_elephant_left.set_player('red')
     red_elephant_left.set_current_location('c1')
     new_game.append(red_elephant_left)
 
@@ -1284,7 +1339,7 @@ def NewGame():
 
     black_soldier_four = Soldier()
     black_soldier_four.set_player('black')
-    black_soldier_four.set_current_location('d2')
+    black_soldier_four.set_current_location('g7')
     new_game.append(black_soldier_four)
 
     black_soldier_five = Soldier()
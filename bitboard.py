@@ -0,0 +1,205 @@
+# Name: Xiangqi Bitboards
+# Language: Python 3
+# Description: Bitboard move generator for the game Xiangqi. Every square of the 90 square board is one bit of a
+# Python integer, using the same square numbering as Xaingqi.py (bit 0 is a1, bit 89 is i10).
+
+# Modules
+from geometry import (SQUARE_ROWS, SQUARE_COLUMNS, PIECE_NAMES, GENERAL_MOVES, ADVISOR_MOVES, ELEPHANT_MOVES,
+                      HORSE_MOVES, SOLDIER_MOVES)
+
+SQUARE_BITS = tuple(1 << square for square in range(90))
+
+
+def build_slide_tables(length):
+    """
+    Precomputes the sliding moves along one line of the board for every position and line occupancy.
+    :param length: The number of squares on the line, 9 for a row and 10 for a column.
+    :return: Three tables indexed by [position][occupancy] of line masks. The first holds the empty squares before the
+    first piece, the second the first piece reached (a chariot capture), and the third the first piece behind that
+    one (a cannon capture).
+    """
+    quiets = []
+    blockers = []
+    jumps = []
+    for position in range(length):
+        position_quiets = []
+        position_blockers = []
+        position_jumps = []
+        for occupancy in range(1 << length):
+            quiet = 0
+            blocker = 0
+            jump = 0
+            for direction in (-1, +1):
+                i = position + direction
+                screen_found = False
+                while 0 <= i < length:
+                    if not occupancy & (1 << i):
+                        if not screen_found:
+                            quiet |= 1 << i
+                    elif not screen_found:
+                        blocker |= 1 << i
+                        screen_found = True
+                    else:
+                        jump |= 1 << i
+                        break
+                    i += direction
+            position_quiets.append(quiet)
+            position_blockers.append(blocker)
+            position_jumps.append(jump)
+        quiets.append(tuple(position_quiets))
+        blockers.append(tuple(position_blockers))
+        jumps.append(tuple(position_jumps))
+    return tuple(quiets), tuple(blockers), tuple(jumps)
+
+
+def build_file_spread_table():
+    """
+    Precomputes the board mask of every 10 bit column mask, so a column lookup can be turned back into squares.
+    :return: Table indexed by [column][column mask] of board masks.
+    """
+    table = []
+    for column in range(9):
+        masks = []
+        for line in range(1 << 10):
+            mask = 0
+            for row in range(10):
+                if line & (1 << row):
+                    mask |= SQUARE_BITS[row * 9 + column]
+            masks.append(mask)
+        table.append(tuple(masks))
+    return tuple(table)
+
+
+# Sliding tables generated once at import. Rows are looked up with the 9 bit occupancy of the row and columns with
+# the 10 bit occupancy of the column.
+ROW_QUIETS, ROW_BLOCKERS, ROW_JUMPS = build_slide_tables(9)
+COLUMN_QUIETS, COLUMN_BLOCKERS, COLUMN_JUMPS = build_slide_tables(10)
+COLUMN_SPREAD = build_file_spread_table()
+
+LEAPER_TABLES = {'GENERAL': GENERAL_MOVES, 'ADVISOR': ADVISOR_MOVES, 'ELEPHANT': ELEPHANT_MOVES,
+                 'SOLDIER': SOLDIER_MOVES}
+
+
+def squares_of(mask):
+    """
+    Yields the squares of the bits set in a board mask, lowest square first.
+    :param mask: The board mask.
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class BitboardPosition:
+    """
+    Occupancy of a Xiangqi position held as bitboards, one per player and one per player and piece name. The
+    occupancy of every row and column is also kept as a small integer so sliding moves are a table lookup.
+
+    :items:
+    _occupancy - Board mask of every piece of a player, keyed by 'red' or 'black'.
+    _pieces - Board mask of the pieces of a player and name, keyed by (player, name).
+    _row_occupancy - 9 bit occupancy of each of the 10 rows.
+    _column_occupancy - 10 bit occupancy of each of the 9 columns.
+    """
+
+    def __init__(self, piece_list=()):
+        self._occupancy = {'red': 0, 'black': 0}
+        self._pieces = {}
+        for player in ('red', 'black'):
+            for name in PIECE_NAMES:
+                self._pieces[(player, name)] = 0
+        self._row_occupancy = [0] * 10
+        self._column_occupancy = [0] * 9
+
+        for i in piece_list:
+            self.add_piece(i.get_player(), i.get_piece_name(), i.get_square())
+
+    def get_occupancy(self, player=None):
+        """
+        :param player: 'red' or 'black', or None for both players.
+        :return: Board mask of the squares occupied by the player.
+        """
+        if player is None:
+            return self._occupancy['red'] | self._occupancy['black']
+        return self._occupancy[player]
+
+    def get_pieces(self, player, name):
+        """
+        :return: Board mask of the pieces of a player with the given name.
+        """
+        return self._pieces[(player, name)]
+
+    def add_piece(self, player, name, square):
+        """Places a piece of a player on an empty square."""
+        bit = SQUARE_BITS[square]
+        self._occupancy[player] |= bit
+        self._pieces[(player, name)] |= bit
+        self._row_occupancy[SQUARE_ROWS[square]] |= 1 << SQUARE_COLUMNS[square]
+        self._column_occupancy[SQUARE_COLUMNS[square]] |= 1 << SQUARE_ROWS[square]
+
+    def remove_piece(self, player, name, square):
+        """Removes a piece of a player from its square."""
+        bit = SQUARE_BITS[square]
+        self._occupancy[player] &= ~bit
+        self._pieces[(player, name)] &= ~bit
+        self._row_occupancy[SQUARE_ROWS[square]] &= ~(1 << SQUARE_COLUMNS[square])
+        self._column_occupancy[SQUARE_COLUMNS[square]] &= ~(1 << SQUARE_ROWS[square])
+
+    def move_piece(self, player, name, start, end):
+        """Moves a piece of a player from start to an empty end square."""
+        self.remove_piece(player, name, start)
+        self.add_piece(player, name, end)
+
+    def piece_moves(self, player, name, square):
+        """
+        Finds the squares a piece can move to.
+        :param player: The player owning the piece.
+        :param name: The name of the piece.
+        :param square: The square of the piece.
+        :return: Board mask of the destination squares.
+        """
+        own = self._occupancy[player]
+        if name == 'CHARIOT' or name == 'CANNON':
+            row = SQUARE_ROWS[square]
+            column = SQUARE_COLUMNS[square]
+            row_occupancy = self._row_occupancy[row]
+            column_occupancy = self._column_occupancy[column]
+            quiets = (ROW_QUIETS[column][row_occupancy] << (row * 9)) | \
+                COLUMN_SPREAD[column][COLUMN_QUIETS[row][column_occupancy]]
+            if name == 'CHARIOT':
+                captures = (ROW_BLOCKERS[column][row_occupancy] << (row * 9)) | \
+                    COLUMN_SPREAD[column][COLUMN_BLOCKERS[row][column_occupancy]]
+            else:
+                captures = (ROW_JUMPS[column][row_occupancy] << (row * 9)) | \
+                    COLUMN_SPREAD[column][COLUMN_JUMPS[row][column_occupancy]]
+            return quiets | (captures & ~own)
+
+        if name == 'HORSE':
+            moves = HORSE_MOVES[square]
+        else:
+            moves = LEAPER_TABLES[name][player][square]
+        occupancy = self._occupancy['red'] | self._occupancy['black']
+        mask = 0
+        for position, block in moves:
+            if block is None or not occupancy & SQUARE_BITS[block]:
+                mask |= SQUARE_BITS[position]
+        return mask & ~own
+
+    def piece_move_squares(self, player, name, square):
+        """
+        :return: List of the destination squares of a piece, see piece_moves.
+        """
+        return list(squares_of(self.piece_moves(player, name, square)))
+
+    def generate(self, player, captures_only=False):
+        """
+        Yields every move of a player as (start, end) squares.
+        :param player: 'red' or 'black'.
+        :param captures_only: True to yield only the moves onto enemy pieces.
+        """
+        targets = self._occupancy['black' if player == 'red' else 'red'] if captures_only else -1
+        for name in ('CHARIOT', 'CANNON', 'HORSE', 'SOLDIER', 'ELEPHANT', 'ADVISOR', 'GENERAL'):
+            for start in squares_of(self._pieces[(player, name)]):
+                for end in squares_of(self.piece_moves(player, name, start) & targets):
+                    yield start, end
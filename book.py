@@ -0,0 +1,185 @@
+# Name: Xiangqi Opening Book
+# Language: Python 3
+# Description: Opening book for the game Xiangqi. The book is built offline from game records into a binary file of
+# fixed width entries sorted by the Zobrist key of the position. At runtime the file is memory mapped and binary
+# searched, so a lookup reads only the entries it needs and the book is never loaded into memory.
+# Usage: python book.py games.pgn [more.pgn ...] --output book.bin [--plies 20] [--min-count 2]
+
+# Modules
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+from Xaingqi import Xiangqi, START_FEN
+from replay import read_games, game_notation, legal_moves
+from transposition import encode_move, decode_move
+
+# One entry is the 64 bit key of a position, the move packed with encode_move and the weight of the move.
+ENTRY_FORMAT = struct.Struct('<QHH')
+ENTRY_SIZE = ENTRY_FORMAT.size
+MAX_WEIGHT = 0xFFFF
+
+
+def count_book_moves(sources, max_plies=20, notation='iccs'):
+    """
+    Counts how often each move was played in each position of the opening of a set of games.
+    :param sources: Game record sources, each a file path, an open text file or an iterable of lines.
+    :param max_plies: Number of moves from the start of each game to count.
+    :param notation: 'iccs' or 'wxf', used when a game has no Format tag naming one of them.
+    :return: Tuple of a dictionary of (key, packed move) to the number of times the move was played, and the number
+    of games left out because their FEN tag could not be read.
+    """
+    counts = {}
+    errors = 0
+    for source in sources:
+        for tags, moves in read_games(source):
+            try:
+                position = Xiangqi.from_fen(tags.get('FEN') or START_FEN)
+            except ValueError:
+                errors += 1
+                continue
+            for position, move in legal_moves(position, moves[:max_plies], game_notation(tags, notation)):
+                entry = (position.get_zobrist_key(), encode_move(move))
+                counts[entry] = counts.get(entry, 0) + 1
+                position.push(move)
+    return counts, errors
+
+
+def write_book(counts, path, min_count=1):
+    """
+    Writes a book file from move counts, sorted by key and then by move.
+    :param counts: Dictionary of (key, packed move) to weight, see count_book_moves.
+    :param path: Path of the book file to write.
+    :param min_count: Moves played fewer times than this are left out.
+    :return: The number of entries written.
+    """
+    entries = sorted(entry for entry, count in counts.items() if count >= min_count)
+    with open(path, 'wb') as file:
+        for key, move in entries:
+            file.write(ENTRY_FORMAT.pack(key, move, min(counts[(key, move)], MAX_WEIGHT)))
+    return len(entries)
+
+
+class OpeningBook:
+    """
+    Read only view of a book file.
+
+    :items:
+    _file - The open book file.
+    _map - Memory map of the book file, or None if the book is empty.
+    _entries - Number of entries in the book.
+    """
+
+    def __init__(self, path):
+        """
+        Opens and memory maps a book file written by write_book.
+        :param path: Path of the book file.
+        """
+        self._file = open(path, 'rb')
+        self._map = None
+        self._entries = 0
+        size = self._file.seek(0, 2)
+        if size % ENTRY_SIZE:
+            self._file.close()
+            raise ValueError("book file size is not a whole number of entries: " + path)
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._entries = size // ENTRY_SIZE
+
+    def get_size(self):
+        """
+        :return: The number of entries in the book.
+        """
+        return self._entries
+
+    def close(self):
+        """Unmaps and closes the book file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def read_entry(self, index):
+        """
+        :param index: Index of the entry, 0 - get_size() - 1.
+        :return: Tuple of the key, packed move and weight of the entry.
+        """
+        return ENTRY_FORMAT.unpack_from(self._map, index * ENTRY_SIZE)
+
+    def find_key(self, key):
+        """
+        Binary searches for the first entry of a position.
+        :param key: The 64 bit key of the position.
+        :return: Index of the first entry with a key not below key.
+        """
+        low = 0
+        high = self._entries
+        while low < high:
+            middle = (low + high) // 2
+            if self.read_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_moves(self, position):
+        """
+        Looks up the book moves of a position. Moves that are not legal in the position, which only happens when two
+        positions share a key, are left out.
+        :param position: The Xiangqi game.
+        :return: List of (move, weight) with the move as (start, end) squares, highest weight first.
+        """
+        key = position.get_zobrist_key()
+        moves = []
+        index = self.find_key(key)
+        while index < self._entries:
+            entry_key, packed_move, weight = self.read_entry(index)
+            if entry_key != key:
+                break
+            move = decode_move(packed_move)
+            if position.is_pseudo_legal(move) and position.is_legal_move(move):
+                moves.append((move, weight))
+            index += 1
+        moves.sort(key=lambda book_move: -book_move[1])
+        return moves
+
+    def choose_move(self, position, rng=random):
+        """
+        Picks a book move of a position at random, in proportion to the weights.
+        :param position: The Xiangqi game.
+        :param rng: Random number generator to use.
+        :return: The move as (start, end) squares, or None if the position is not in the book.
+        """
+        moves = self.get_moves(position)
+        if not moves:
+            return None
+        pick = rng.randrange(sum(weight for move, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+        return moves[-1][0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Xiangqi opening book from game records.")
+    parser.add_argument("records", nargs="+", help="game record files")
+    parser.add_argument("--output", default="book.bin", help="book file to write (default book.bin)")
+    parser.add_argument("--plies", type=int, default=20, help="moves counted from the start of each game")
+    parser.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times")
+    parser.add_argument("--notation", default="iccs", choices=("iccs", "wxf"),
+                        help="move notation of games without a Format tag (default iccs)")
+    args = parser.parse_args(argv)
+
+    counts, errors = count_book_moves(args.records, args.plies, args.notation)
+    entries = write_book(counts, args.output, args.min_count)
+    print("Entries: %d (%d bytes)" % (entries, entries * ENTRY_SIZE))
+    if errors:
+        print("Games left out with a bad FEN tag: %d" % errors)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
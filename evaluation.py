@@ -0,0 +1,176 @@
+# Name: Xiangqi Evaluation
+# Language: Python 3
+# Description: Static evaluation of Xiangqi positions from material and piece-square tables. Single positions are
+# scored from a Xiangqi game, and batches of positions held in the compact encoding of Xiangqi.to_bytes are scored at
+# once with NumPy when it is installed.
+
+# Modules
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from geometry import SQUARE_ROWS, SQUARE_COLUMNS, PIECE_NAMES
+
+# Material values of the pieces.
+PIECE_VALUES = {'GENERAL': 10000, 'ADVISOR': 20, 'ELEPHANT': 20, 'HORSE': 40, 'CHARIOT': 90, 'CANNON': 45,
+                'SOLDIER': 10}
+
+# Piece-square tables from the point of view of red, listed from row 10 at the top down to row 1, the red back row.
+# Each value is added to the material value of the piece on that square. Black uses the same tables turned upside down.
+PIECE_SQUARE_ROWS = {
+    'GENERAL': ((0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, -4, -6, -4, 0, 0, 0),
+                (0, 0, 0, -2, -2, -2, 0, 0, 0),
+                (0, 0, 0, 1, 3, 1, 0, 0, 0)),
+    'ADVISOR': ((0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 3, 0, 0, 0, 0),
+                (0, 0, 0, 1, 0, 1, 0, 0, 0)),
+    'ELEPHANT': ((0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (-1, 0, 0, 0, 3, 0, 0, 0, -1),
+                 (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                 (0, 0, 1, 0, 0, 0, 1, 0, 0)),
+    'HORSE': ((0, -1, 1, 2, 0, 2, 1, -1, 0),
+              (0, 2, 4, 3, 2, 3, 4, 2, 0),
+              (1, 3, 5, 5, 4, 5, 5, 3, 1),
+              (1, 4, 4, 6, 5, 6, 4, 4, 1),
+              (0, 2, 4, 4, 4, 4, 4, 2, 0),
+              (0, 1, 3, 3, 3, 3, 3, 1, 0),
+              (0, 1, 2, 2, 2, 2, 2, 1, 0),
+              (-1, 0, 1, 1, -1, 1, 1, 0, -1),
+              (-2, -1, 0, 0, -2, 0, 0, -1, -2),
+              (-3, -2, -1, -1, -2, -1, -1, -2, -3)),
+    'CHARIOT': ((2, 3, 2, 4, 4, 4, 2, 3, 2),
+                (2, 4, 3, 5, 6, 5, 3, 4, 2),
+                (2, 3, 2, 4, 4, 4, 2, 3, 2),
+                (2, 3, 3, 4, 4, 4, 3, 3, 2),
+                (2, 4, 4, 5, 5, 5, 4, 4, 2),
+                (1, 3, 3, 4, 4, 4, 3, 3, 1),
+                (0, 2, 2, 3, 3, 3, 2, 2, 0),
+                (-1, 1, 1, 2, 2, 2, 1, 1, -1),
+                (-1, 1, 0, 2, 0, 2, 0, 1, -1),
+                (-3, 1, 0, 2, 0, 2, 0, 1, -3)),
+    'CANNON': ((2, 2, 0, -2, -3, -2, 0, 2, 2),
+               (1, 1, 0, -1, -2, -1, 0, 1, 1),
+               (1, 1, 0, -2, 2, -2, 0, 1, 1),
+               (0, 0, 0, 0, 2, 0, 0, 0, 0),
+               (0, 0, 0, 0, 2, 0, 0, 0, 0),
+               (-1, 0, 1, 0, 2, 0, 1, 0, -1),
+               (0, 0, 0, 0, 1, 0, 0, 0, 0),
+               (1, 0, 2, 1, 3, 1, 2, 0, 1),
+               (0, 1, 1, 1, 1, 1, 1, 1, 0),
+               (0, 0, 1, 2, 2, 2, 1, 0, 0)),
+    'SOLDIER': ((0, 0, 0, 1, 2, 1, 0, 0, 0),
+                (6, 8, 10, 12, 12, 12, 10, 8, 6),
+                (6, 8, 10, 11, 12, 11, 10, 8, 6),
+                (4, 6, 8, 9, 10, 9, 8, 6, 4),
+                (2, 3, 4, 5, 6, 5, 4, 3, 2),
+                (0, 0, -1, 0, 2, 0, -1, 0, 0),
+                (0, 0, 0, 0, 1, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0),
+                (0, 0, 0, 0, 0, 0, 0, 0, 0)),
+}
+
+
+def build_square_scores(name, player):
+    """
+    Precomputes the material plus piece-square value of a piece on every square.
+    :param name: The name of the piece.
+    :param player: The player owning the piece, 'red' or 'black'.
+    :return: Tuple indexed by square 0 - 89, where square 0 is a1 and row 0 is the red back row.
+    """
+    rows = PIECE_SQUARE_ROWS[name]
+    scores = []
+    for square in range(90):
+        row = SQUARE_ROWS[square]
+        column = SQUARE_COLUMNS[square]
+        if player == 'black':
+            row = 9 - row
+        scores.append(PIECE_VALUES[name] + rows[9 - row][column])
+    return tuple(scores)
+
+
+# Value of every player, piece name and square, keyed by (player, name).
+SQUARE_SCORES = {(player, name): build_square_scores(name, player)
+                 for player in ('red', 'black') for name in PIECE_NAMES}
+
+# Value of every code of the compact encoding on every square, for red minus black. Indexed by [code + 7][square],
+# codes run from -7 for a black soldier to 7 for a red soldier with 0 for an empty square.
+CODE_SCORES = tuple(tuple(0 for _ in range(90)) if code == 0 else
+                    SQUARE_SCORES[('red', PIECE_NAMES[code - 1])] if code > 0 else
+                    tuple(-score for score in SQUARE_SCORES[('black', PIECE_NAMES[-code - 1])])
+                    for code in range(-7, 8))
+
+# The same table and the square indexes as NumPy arrays, for evaluate_batch.
+if numpy is not None:
+    CODE_SCORE_ARRAY = numpy.array(CODE_SCORES, dtype=numpy.int32)
+    SQUARE_RANGE = numpy.arange(90)
+
+
+def evaluate(position):
+    """
+    Scores a position from material and piece-square tables, computed from scratch by Xiangqi.compute_score.
+    :param position: A Xiangqi game.
+    :return: The score in the point of view of the current player, higher is better for them.
+    """
+    score = position.compute_score()
+    return score if position.get_player_turn() == 'red' else -score
+
+
+def evaluate_bytes(data):
+    """
+    Scores one position in the compact encoding of Xiangqi.to_bytes.
+    :param data: The 91 bytes of the position, or 90 bytes to score it for red.
+    :return: The score in the point of view of the player to move, see evaluate.
+    """
+    score = 0
+    for square in range(90):
+        code = data[square]
+        if code:
+            # Bytes hold the signed codes as 0 - 255.
+            if code > 127:
+                code -= 256
+            score += CODE_SCORES[code + 7][square]
+    return -score if len(data) > 90 and data[90] else score
+
+
+def evaluate_batch(positions):
+    """
+    Scores many positions in the compact encoding of Xiangqi.to_bytes at once. With NumPy installed the whole batch
+    is scored with array operations, otherwise each position is scored in turn with evaluate_bytes.
+    :param positions: A 2D int8 array of one position per row, or a list of bytes objects. Rows of 91 values are
+    scored for the player to move and rows of 90 values for red.
+    :return: The scores, as a NumPy int32 array when NumPy is installed and as a list otherwise.
+    """
+    if numpy is None:
+        return [evaluate_bytes(data) for data in positions]
+
+    if len(positions) == 0:
+        return numpy.zeros(0, dtype=numpy.int32)
+    if not isinstance(positions, numpy.ndarray):
+        positions = numpy.array([numpy.frombuffer(data, dtype=numpy.int8) for data in positions], dtype=numpy.int8)
+    positions = positions.reshape(len(positions), -1)
+    scores = CODE_SCORE_ARRAY[positions[:, :90].astype(numpy.intp) + 7, SQUARE_RANGE].sum(axis=1, dtype=numpy.int32)
+    if positions.shape[1] > 90:
+        scores = numpy.where(positions[:, 90] != 0, -scores, scores)
+    return scores
@@ -0,0 +1,126 @@
+# Name: Xiangqi Geometry
+# Language: Python 3
+# Description: Board geometry of the game Xiangqi, computed once at import and shared by the piece classes, the
+# bitboard backend, the evaluation and the tablebases: the square encoding, the castle and river masks of each player,
+# the precomputed move and attack tables, and the fixed order of the piece names.
+
+# Integer square encoding. Square 0 is a1 and squares count along each row of nine columns, so a square is
+# row * 9 + column with row 0 on the red side of the board. Alphanumeric locations are only used at the boundary.
+SQUARE_NAMES = tuple(column + str(row) for row in range(1, 11) for column in "abcdefghi")
+SQUARE_INDEXES = {name: square for square, name in enumerate(SQUARE_NAMES)}
+SQUARE_ROWS = tuple(square // 9 for square in range(90))
+SQUARE_COLUMNS = tuple(square % 9 for square in range(90))
+
+# Castle (palace), own half of the board and the enemy half across the river for each player.
+CASTLE_SQUARES = {'red': frozenset(row * 9 + column for row in (0, 1, 2) for column in (3, 4, 5)),
+                  'black': frozenset(row * 9 + column for row in (7, 8, 9) for column in (3, 4, 5))}
+HOME_SQUARES = {'red': frozenset(range(0, 45)), 'black': frozenset(range(45, 90))}
+RIVER_CROSSED_SQUARES = {'red': HOME_SQUARES['black'], 'black': HOME_SQUARES['red']}
+
+# Each square reflected left to right across the middle column, and top to bottom across the river.
+MIRRORED_SQUARES = tuple(square + 8 - 2 * SQUARE_COLUMNS[square] for square in range(90))
+FLIPPED_SQUARES = tuple(square + (9 - 2 * SQUARE_ROWS[square]) * 9 for square in range(90))
+
+
+def build_move_table(steps, allowed=None):
+    """
+    Precomputes the moves of a leaping piece from every square of the board.
+    :param steps: Tuple of (row, column, block row, block column) offsets. The block offsets point at the leg or eye
+    that must be empty for the move, or are None if the move can't be blocked.
+    :param allowed: Optional set of squares both the piece and its destination must stay within.
+    :return: Tuple indexed by square of tuples of (destination, block) squares.
+    """
+    table = []
+    for square in range(90):
+        moves = []
+        for row, column, block_row, block_column in steps:
+            index_row = SQUARE_ROWS[square] + row
+            index_column = SQUARE_COLUMNS[square] + column
+            if not (0 <= index_row < 10 and 0 <= index_column < 9):
+                continue
+            position = index_row * 9 + index_column
+            if allowed is not None and (square not in allowed or position not in allowed):
+                continue
+            block = None
+            if block_row is not None:
+                block = square + block_row * 9 + block_column
+            moves.append((position, block))
+        table.append(tuple(moves))
+    return tuple(table)
+
+
+def build_soldier_table(player, forward):
+    """
+    Precomputes the moves of a soldier, which steps forward and may also step sideways once past the river.
+    :param player: The player owning the soldier.
+    :param forward: The row offset of a forward step, +1 for red and -1 for black.
+    :return: Tuple indexed by square of tuples of (destination, block) squares.
+    """
+    forward_moves = build_move_table(((forward, 0, None, None),))
+    sideways_moves = build_move_table(((0, -1, None, None), (0, +1, None, None)))
+    crossed = RIVER_CROSSED_SQUARES[player]
+    return tuple(forward_moves[square] + (sideways_moves[square] if square in crossed else ())
+                 for square in range(90))
+
+
+ORTHOGONAL_STEPS = ((+1, 0, None, None), (-1, 0, None, None), (0, -1, None, None), (0, +1, None, None))
+DIAGONAL_STEPS = ((+1, +1, None, None), (+1, -1, None, None), (-1, +1, None, None), (-1, -1, None, None))
+ELEPHANT_STEPS = ((+2, +2, +1, +1), (+2, -2, +1, -1), (-2, +2, -1, +1), (-2, -2, -1, -1))
+HORSE_STEPS = ((+2, +1, +1, 0), (+2, -1, +1, 0), (-2, +1, -1, 0), (-2, -1, -1, 0),
+               (+1, +2, 0, +1), (-1, +2, 0, +1), (+1, -2, 0, -1), (-1, -2, 0, -1))
+
+# Move tables generated once at import, indexed by player where the piece is confined to part of the board.
+GENERAL_MOVES = {player: build_move_table(ORTHOGONAL_STEPS, CASTLE_SQUARES[player]) for player in ('red', 'black')}
+ADVISOR_MOVES = {player: build_move_table(DIAGONAL_STEPS, CASTLE_SQUARES[player]) for player in ('red', 'black')}
+ELEPHANT_MOVES = {player: build_move_table(ELEPHANT_STEPS, HOME_SQUARES[player]) for player in ('red', 'black')}
+HORSE_MOVES = build_move_table(HORSE_STEPS)
+SOLDIER_MOVES = {'red': build_soldier_table('red', +1), 'black': build_soldier_table('black', -1)}
+
+
+def build_attack_table(move_table):
+    """
+    Reverses a move table, so the pieces that could attack a square can be found by looking outward from it.
+    :param move_table: Tuple indexed by square of tuples of (destination, block) squares.
+    :return: Tuple indexed by the attacked square of tuples of (attacker square, block) squares.
+    """
+    attacks = [[] for _ in range(90)]
+    for square in range(90):
+        for position, block in move_table[square]:
+            attacks[position].append((square, block))
+    return tuple(tuple(i) for i in attacks)
+
+
+def build_ray_table():
+    """
+    Precomputes the squares along each straight line out of every square, nearest first.
+    :return: Tuple indexed by square of the up and down column rays and the left and right row rays.
+    """
+    table = []
+    for square in range(90):
+        rays = []
+        for row, column in ((+1, 0), (-1, 0), (0, -1), (0, +1)):
+            index_row = SQUARE_ROWS[square] + row
+            index_column = SQUARE_COLUMNS[square] + column
+            ray = []
+            while 0 <= index_row < 10 and 0 <= index_column < 9:
+                ray.append(index_row * 9 + index_column)
+                index_row += row
+                index_column += column
+            rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return tuple(table)
+
+
+# Attack tables of the leaping pieces keyed by (player, name), and the straight lines used by chariots, cannons and
+# the flying general.
+LEAPER_ATTACKS = {(player, name): build_attack_table(table)
+                  for player in ('red', 'black')
+                  for name, table in (('GENERAL', GENERAL_MOVES[player]), ('ADVISOR', ADVISOR_MOVES[player]),
+                                      ('ELEPHANT', ELEPHANT_MOVES[player]), ('HORSE', HORSE_MOVES),
+                                      ('SOLDIER', SOLDIER_MOVES[player]))}
+RAYS = build_ray_table()
+
+# Piece names in a fixed order. The compact encoding of a position stores a piece as its index in this tuple plus one,
+# positive for red and negative for black, with 0 for an empty square.
+PIECE_NAMES = ('GENERAL', 'ADVISOR', 'ELEPHANT', 'HORSE', 'CHARIOT', 'CANNON', 'SOLDIER')
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES, 1)}
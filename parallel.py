@@ -0,0 +1,179 @@
+# Name: Xiangqi Parallel
+# Language: Python 3
+# Description: Parallel perft and search for the game Xiangqi. The legal moves at the root of a position are split
+# across a pool of worker processes. Each worker gets the position in the 91 byte encoding of Xiangqi.to_bytes and one
+# root move, and the results are merged in the order of the root moves. Lazy SMP runs the whole search in every worker
+# instead, the workers sharing one transposition table.
+
+# Modules
+import random
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from Xaingqi import Xiangqi
+from perft import perft
+from search import Searcher, MATE_SCORE, INFINITY
+from transposition import SharedTranspositionTable
+
+
+def perft_worker(data, backend, move, depth):
+    """
+    Counts the leaf nodes under one root move, in a worker process.
+    :param data: The root position encoded with Xiangqi.to_bytes.
+    :param backend: Move generator backend of the game.
+    :param move: The root move as (start, end) squares.
+    :param depth: The perft depth of the root position, at least 1.
+    :return: The number of leaf nodes under the move.
+    """
+    position = Xiangqi.from_bytes(data, backend)
+    position.push(move)
+    return perft(position, depth - 1)
+
+
+def search_worker(data, backend, move, depth):
+    """
+    Searches the position after one root move with a full window, in a worker process.
+    :param data: The root position encoded with Xiangqi.to_bytes.
+    :param backend: Move generator backend of the game.
+    :param move: The root move as (start, end) squares.
+    :param depth: The search depth of the root position, at least 1.
+    :return: The score of the move in the point of view of the player making it.
+    """
+    position = Xiangqi.from_bytes(data, backend)
+    position.push(move)
+    searcher = Searcher()
+    score = 0
+    # Iterative deepening fills the transposition table and history of the worker for the final iteration.
+    for current_depth in range(depth):
+        score = -searcher.alpha_beta(position, current_depth, -INFINITY, INFINITY, 1)
+    return score
+
+
+def map_root_moves(position, worker, depth, executor=None, workers=None):
+    """
+    Runs a worker function for every legal root move of a position on a process pool.
+    :param position: The Xiangqi game, left as it was found.
+    :param worker: Module level function taking the encoded position, backend, move and depth.
+    :param depth: The depth passed to the worker.
+    :param executor: Executor to submit to, so a pool can be kept between calls. A new pool is made if None.
+    :param workers: Number of processes of the new pool, defaults to the number of processors.
+    :return: List of (move, result) for every legal root move.
+    """
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return map_root_moves(position, worker, depth, pool)
+
+    moves = position.legal_moves()
+    data = position.to_bytes()
+    backend = position.get_backend()
+    futures = [executor.submit(worker, data, backend, move, depth) for move in moves]
+    return [(move, future.result()) for move, future in zip(moves, futures)]
+
+
+def parallel_divide(position, depth, executor=None, workers=None):
+    """
+    Splits the perft count of a position by root move, counting the root moves in parallel.
+    :param position: The Xiangqi game, left as it was found.
+    :param depth: The depth in plies to count to, at least 1.
+    :param executor: Executor to submit to, see map_root_moves.
+    :param workers: Number of processes of a new pool, see map_root_moves.
+    :return: List of (move, leaf nodes) for every legal root move, empty for a depth below 1.
+    """
+    if depth < 1:
+        return []
+    return map_root_moves(position, perft_worker, depth, executor, workers)
+
+
+def parallel_perft(position, depth, executor=None, workers=None):
+    """
+    Counts the leaf nodes of the legal move tree of a position, counting the root moves in parallel.
+    :return: The number of leaf nodes, see parallel_divide for the parameters.
+    """
+    if depth <= 1:
+        return perft(position, depth)
+    return sum(nodes for move, nodes in parallel_divide(position, depth, executor, workers))
+
+
+def parallel_search(position, depth, executor=None, workers=None):
+    """
+    Finds the best move of the current player by searching every root move to a fixed depth in parallel. Root moves
+    do not share bounds, so each one gets its exact score.
+    :param position: The Xiangqi game, left as it was found.
+    :param depth: The depth to search in plies, at least 1.
+    :param executor: Executor to submit to, see map_root_moves.
+    :param workers: Number of processes of a new pool, see map_root_moves.
+    :return: Tuple of the best move as (start, end) squares, or None if there is no legal move, and its score in the
+    point of view of the current player.
+    """
+    best_move = None
+    best_score = -MATE_SCORE
+    for move, score in map_root_moves(position, search_worker, depth, executor, workers):
+        if best_move is None or score > best_score:
+            best_move = move
+            best_score = score
+    return best_move, best_score
+
+
+def lazy_smp_worker(data, backend, table_name, megabytes, depth, seed, time_limit=None):
+    """
+    Runs an iterative deepening search of the whole position, in a worker process sharing a transposition table.
+    Helpers stop at their next time check once the table is stopped, which the main worker does when it finishes.
+    :param data: The position encoded with Xiangqi.to_bytes.
+    :param backend: Move generator backend of the game.
+    :param table_name: Name of the SharedTranspositionTable to attach to.
+    :param megabytes: Memory budget the table was created with.
+    :param depth: Maximum depth to search in plies, or None to search until the time limit.
+    :param seed: 0 for the main worker. Helpers start from random history scores made from their seed, so they search
+    the moves in different orders and fill the table with different parts of the tree.
+    :param time_limit: Wall clock budget in seconds, or None.
+    :return: Tuple of the best move and its score, see search.search.
+    """
+    table = SharedTranspositionTable(megabytes, table_name)
+    try:
+        position = Xiangqi.from_bytes(data, backend)
+        history = None
+        if seed:
+            rng = random.Random(seed)
+            history = {(start, end): rng.randrange(16) for start in range(90) for end in range(90)}
+        return Searcher(table, history).search(position, depth, time_limit)
+    finally:
+        if not seed:
+            table.set_stopped()
+        table.close()
+
+
+def lazy_smp_search(position, depth=None, workers=2, megabytes=16, executor=None, time_limit=None):
+    """
+    Finds the best move of the current player with Lazy SMP: every worker searches the same position, and they
+    cooperate through one SharedTranspositionTable. The result of the main worker is returned as soon as it finishes,
+    after the helpers still queued are cancelled and the running ones are stopped through the table.
+    :param position: The Xiangqi game.
+    :param depth: Maximum depth to search in plies. Defaults to the maximum when only a time limit is given.
+    :param workers: Number of searches to run, the main one and workers - 1 helpers.
+    :param megabytes: Memory budget of the shared table.
+    :param executor: Executor to submit to, with at least workers processes. A new pool is made if None.
+    :param time_limit: Wall clock budget of the main worker in seconds, see search.search.
+    :return: Tuple of the best move as (start, end) squares, or None if there is no move, and its score in the point
+    of view of the current player.
+    """
+    if depth is None and time_limit is None:
+        raise ValueError("search needs a depth or a time limit")
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return lazy_smp_search(position, depth, workers, megabytes, pool, time_limit)
+
+    table = SharedTranspositionTable(megabytes)
+    futures = []
+    try:
+        data = position.to_bytes()
+        backend = position.get_backend()
+        futures = [executor.submit(lazy_smp_worker, data, backend, table.get_name(), megabytes, depth, seed,
+                                   time_limit)
+                   for seed in range(workers)]
+        return futures[0].result()
+    finally:
+        # The helpers must detach before the table is freed, which takes them one time check once it is stopped.
+        table.set_stopped()
+        for future in futures[1:]:
+            future.cancel()
+        wait(futures[1:])
+        table.close()
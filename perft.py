@@ -0,0 +1,194 @@
+# Name: Xiangqi Perft
+# Language: Python 3
+# Description: Perft (performance test) for the game Xiangqi. Counts the leaf nodes of the legal move tree of a
+# position to a fixed depth, to check move generation against known counts and to measure its speed.
+# Usage: python perft.py --depth 3 [--fen "<position>"] [--moves "h3e3 h10g8"] [--divide] [--backend bitboard]
+#        [--workers 8]
+#        python perft.py --suite
+
+# Modules
+import argparse
+import sys
+import time
+
+from Xaingqi import Xiangqi, SQUARE_NAMES, SQUARE_INDEXES, START_FEN
+
+# Test positions given as a FEN and a list of moves played from it, with their known leaf counts for depths 1, 2, 3
+# and so on.
+TEST_POSITIONS = [
+    ("Starting position", START_FEN, "", [44, 1920, 79666]),
+    ("Central cannon", START_FEN, "h3e3", [45, 1564, 66333]),
+    ("Central cannon, horse defence", START_FEN, "h3e3 h10g8", [35, 1419, 51045]),
+    ("Cannon takes horse", START_FEN, "b3b10 a10b10", [34, 1457, 46642]),
+    ("Opened river", START_FEN, "c4c5 c7c6 c5c6 g7g6", [46, 1959, 85232]),
+    ("Middlegame", "r1ba1a3/4kn3/2n1b4/pNp1p1p1p/4c4/6P2/P1P2R2P/1CcC5/9/2BAKAB2 w - - 0 1", "",
+     [38, 1128, 43929]),
+    ("Cramped general", "1cbak4/9/n2a5/2p1p3p/5cp2/2n2N3/6PCP/3AB4/2C6/3A1K1N1 w - - 0 1", "",
+     [7, 281, 8620]),
+    ("Chariot against horse", "5a3/3k5/3aR4/9/5r3/5n3/9/3A1A3/5K3/2BC2B2 w - - 0 1", "", [25, 424, 9850]),
+    ("Cannon screens", "CRN1k1b2/3ca4/4ba3/9/2nr5/9/9/4B4/4A4/4KA3 w - - 0 1", "", [28, 516, 14808]),
+    ("Discovered checks", "R1N1k1b2/9/3aba3/9/2nr5/2B6/9/4B4/4A4/4KA3 w - - 0 1", "", [21, 364, 7626]),
+    ("Crossed soldiers", "C1nNk4/9/9/9/9/9/n1pp5/B3C4/9/3A1K3 w - - 0 1", "", [28, 222, 6241]),
+    ("Horse endgame", "4ka3/4a4/9/9/4N4/p8/9/4C3c/7n1/2BK5 w - - 0 1", "", [23, 345, 8124]),
+    ("Horse and cannon", "2b1ka3/9/b3N4/4n4/9/9/9/4C4/2p6/2BK5 w - - 0 1", "", [21, 195, 3883]),
+    ("Double cannon", "1C2ka3/9/C1Nab1n2/p3p3p/6p2/9/P3P3P/3AB4/3p2c2/c1BAK4 w - - 0 1", "",
+     [30, 830, 22787]),
+    ("Pinned defenders", "CnN1k1b2/c3a4/4ba3/9/2nr5/9/9/4C4/4A4/4KA3 w - - 0 1", "", [19, 583, 11714]),
+]
+
+
+def format_move(move):
+    """
+    :param move: Tuple of the start and end squares of a move.
+    :return: The move as start and end locations, such as h3e3.
+    """
+    return SQUARE_NAMES[move[0]] + SQUARE_NAMES[move[1]]
+
+
+def parse_move(text):
+    """
+    :param text: A move written as start and end locations, such as h3e3 or b10c8.
+    :return: Tuple of the start and end squares of the move.
+    """
+    for split in (2, 3):
+        if text[:split] in SQUARE_INDEXES and text[split:] in SQUARE_INDEXES:
+            return SQUARE_INDEXES[text[:split]], SQUARE_INDEXES[text[split:]]
+    raise ValueError("not a move: " + text)
+
+
+def setup_position(moves, backend='pieces', fen=None):
+    """
+    Plays a list of moves from a position.
+    :param moves: The moves separated by spaces, such as "h3e3 h10g8".
+    :param backend: Move generator backend of the game.
+    :param fen: The position to start from in FEN, defaults to the starting position.
+    :return: The Xiangqi game after the moves.
+    """
+    position = Xiangqi(backend) if fen is None else Xiangqi.from_fen(fen, backend)
+    for text in moves.split():
+        position.push(parse_move(text))
+    return position
+
+
+def perft(position, depth):
+    """
+    Counts the leaf nodes of the legal move tree of a position.
+    :param position: The Xiangqi game, left as it was found.
+    :param depth: The depth in plies to count to, a depth of 0 or less counts the position itself.
+    :return: The number of leaf nodes.
+    """
+    if depth <= 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.push(move)
+        nodes += perft(position, depth - 1)
+        position.pop()
+    return nodes
+
+
+def divide(position, depth):
+    """
+    Splits the perft count of a position by root move.
+    :param position: The Xiangqi game, left as it was found.
+    :param depth: The depth in plies to count to, at least 1.
+    :return: List of (move, leaf nodes) for every legal root move, empty for a depth below 1.
+    """
+    if depth < 1:
+        return []
+    results = []
+    for move in position.legal_moves():
+        position.push(move)
+        results.append((move, perft(position, depth - 1)))
+        position.pop()
+    return results
+
+
+def run_suite(backend='pieces', max_depth=None, out=sys.stdout):
+    """
+    Runs perft on every test position and compares the counts with the known ones.
+    :param backend: Move generator backend to test.
+    :param max_depth: Deepest depth to check, defaults to every known count.
+    :param out: Stream to report to.
+    :return: True if every count matched.
+    """
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, moves, counts in TEST_POSITIONS:
+        position = setup_position(moves, backend, fen)
+        for depth, expected in enumerate(counts, 1):
+            if max_depth is not None and depth > max_depth:
+                break
+            start_time = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == expected else "FAILED, expected " + str(expected)
+            passed = passed and nodes == expected
+            print("%-32s depth %d %10d nodes %8.2fs  %s" % (name, depth, nodes, elapsed, status), file=out)
+    print("Total %d nodes in %.2fs, %.0f nodes/s" % (total_nodes, total_time, total_nodes / max(total_time, 1e-9)),
+          file=out)
+    return passed
+
+
+def non_negative_int(text):
+    """
+    Reads a depth argument.
+    :param text: The argument text.
+    :return: The depth, 0 or more.
+    """
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("must not be negative: " + text)
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the leaf nodes of the Xiangqi move tree.")
+    parser.add_argument("--depth", type=non_negative_int, default=3, help="depth in plies (default 3)")
+    parser.add_argument("--fen", default=None, help="position to start from, defaults to the starting position")
+    parser.add_argument("--moves", default="", help="moves from the position, such as \"h3e3 h10g8\"")
+    parser.add_argument("--divide", action="store_true", help="report the count of every root move")
+    parser.add_argument("--suite", action="store_true", help="check the test positions against their known counts")
+    parser.add_argument("--backend", default="pieces", choices=("pieces", "bitboard"), help="move generator")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="count the root moves in parallel on this many processes")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if run_suite(args.backend, args.depth) else 1
+
+    position = setup_position(args.moves, args.backend, args.fen)
+    start_time = time.perf_counter()
+    if args.depth == 0:
+        # The position itself is the only leaf, there are no root moves to split it by.
+        nodes = perft(position, 0)
+    elif args.workers is not None:
+        # Imported here as parallel.py imports this module.
+        from parallel import parallel_divide
+        results = parallel_divide(position, args.depth, workers=args.workers)
+        nodes = sum(count for move, count in results)
+        if args.divide:
+            for move, count in results:
+                print("%s: %d" % (format_move(move), count))
+    elif args.divide:
+        results = divide(position, args.depth)
+        for move, nodes in results:
+            print("%s: %d" % (format_move(move), nodes))
+        nodes = sum(count for move, count in results)
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = time.perf_counter() - start_time
+    print("Nodes: %d" % nodes)
+    print("Time: %.2fs (%.0f nodes/s)" % (elapsed, nodes / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
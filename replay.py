@@ -0,0 +1,272 @@
+# Name: Xiangqi Replay
+# Language: Python 3
+# Description: Streaming replay of Xiangqi game records. Games are read one at a time from a file or any iterable of
+# lines, so archives of any size are replayed in constant memory. Every move is checked with the legal move filter of
+# the game and played with push, without rebuilding the move pools or the debug dictionaries of make_move.
+#
+# Records are PGN like. Tag lines such as [FEN "..."] or [Format "WXF"] come before the moves of a game, and a game
+# ends at a result token (1-0, 0-1, 1/2-1/2 or *), a blank line after its moves, the next tag line or the end of the
+# input. Move numbers such as "1." are skipped, so one game per line also works. Comments in braces or after a
+# semicolon and variations in parentheses are left out.
+
+# Modules
+import re
+from collections import namedtuple
+
+from Xaingqi import Xiangqi, START_FEN
+
+# Result of replaying one game.
+# game - Index of the game in the input, from 0.
+# state - Game state after the last legal move, UNFINISHED, RED_WON, BLACK_WON or STALEMATE.
+# moves - Number of moves played.
+# illegal_move - Index from 0 of the first move that could not be played, or None if every move was legal.
+# illegal_text - The text of that move, or None.
+# fen - FEN of the position after the last legal move.
+# snapshots - FEN after every move played when snapshots were requested, otherwise None.
+# tags - Dictionary of the tags of the game.
+# error - Why the game could not be set up, such as a bad FEN tag, or None. The state is then INVALID_SETUP.
+ReplayResult = namedtuple('ReplayResult', 'game state moves illegal_move illegal_text fen snapshots tags error',
+                          defaults=(None,))
+
+RESULT_TOKENS = frozenset(('1-0', '0-1', '1/2-1/2', '*'))
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*\]')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+ICCS_PATTERN = re.compile(r'^([a-i])([0-9])-?([a-i])([0-9])$')
+WXF_PATTERN = re.compile(r'^([KGAMSEBHNRCP])([1-9+\-])([.=+\-])([1-9])$|^([+\-])([KGAMSEBHNRCP])([.=+\-])([1-9])$')
+
+# Piece names of the WXF letters, including the common alternatives.
+WXF_PIECES = {'K': 'GENERAL', 'G': 'GENERAL', 'A': 'ADVISOR', 'M': 'ADVISOR', 'S': 'ADVISOR', 'E': 'ELEPHANT',
+              'B': 'ELEPHANT', 'H': 'HORSE', 'N': 'HORSE', 'R': 'CHARIOT', 'C': 'CANNON', 'P': 'SOLDIER'}
+
+
+def read_lines(source):
+    """
+    Yields the lines of a game record source.
+    :param source: A file path, an open text file, or an iterable of lines.
+    """
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', errors='replace') as file:
+            yield from file
+    else:
+        yield from source
+
+
+def strip_annotations(line, nesting):
+    """
+    Removes the comments and variations from a line of moves. Brace comments and parenthesised variations may span
+    lines, and variations may nest, while a semicolon comments out the rest of its line.
+    :param line: The line of moves.
+    :param nesting: List of the brackets left open by earlier lines, updated in place.
+    :return: The text of the line outside comments and variations, with a space in place of each character removed.
+    """
+    kept = []
+    for character in line:
+        if nesting and nesting[-1] == '{':
+            if character == '}':
+                nesting.pop()
+            character = ' '
+        elif character in '{(':
+            nesting.append(character)
+            character = ' '
+        elif character == ')' and nesting:
+            nesting.pop()
+            character = ' '
+        elif character == ';':
+            break
+        elif nesting:
+            character = ' '
+        kept.append(character)
+    return ''.join(kept)
+
+
+def read_games(source):
+    """
+    Splits a game record source into games, holding only one game in memory at a time.
+    :param source: A file path, an open text file, or an iterable of lines.
+    :return: Yields a tuple of the tag dictionary and the list of move texts of each game.
+    """
+    tags = {}
+    moves = []
+    nesting = []
+    for line in read_lines(source):
+        line = line.strip()
+        if not line:
+            if moves and not nesting:
+                yield tags, moves
+                tags, moves = {}, []
+            continue
+
+        # A tag line closes any comment or variation left open, so one bad game can't swallow the ones after it.
+        if line.startswith('['):
+            nesting = []
+            if moves:
+                yield tags, moves
+                tags, moves = {}, []
+            match = TAG_PATTERN.match(line)
+            if match:
+                tags[match.group(1)] = match.group(2)
+            continue
+
+        for token in strip_annotations(line, nesting).split():
+            token = MOVE_NUMBER_PATTERN.sub('', token)
+            if not token:
+                continue
+            if token in RESULT_TOKENS:
+                yield tags, moves
+                tags, moves = {}, []
+                continue
+            moves.append(token)
+    if moves or tags:
+        yield tags, moves
+
+
+def parse_iccs(text):
+    """
+    Reads a move in ICCS coordinates, such as h2e2 or H2-E2, where rows count from 0 on the red side.
+    :param text: The move text.
+    :return: Tuple of the start and end squares of the move, or None if it is not an ICCS move.
+    """
+    match = ICCS_PATTERN.match(text.lower())
+    if match is None:
+        return None
+    start_column, start_row, end_column, end_row = match.groups()
+    return (int(start_row) * 9 + ord(start_column) - ord('a'),
+            int(end_row) * 9 + ord(end_column) - ord('a'))
+
+
+def wxf_column(player, file_number):
+    """
+    :param player: The player moving, files count from the right hand side of that player.
+    :param file_number: The WXF file 1 - 9.
+    :return: The board column 0 - 8 of the file.
+    """
+    return 9 - file_number if player == 'red' else file_number - 1
+
+
+def parse_wxf(position, text):
+    """
+    Reads a move in WXF notation for the current player, such as C2.5, H8+7 or +R-1. A letter names the piece, then
+    comes its file, or + and - for the front and rear of two pieces on one file. Then . moves along the row to the
+    given file, and + and - advance or retreat. Chariots, cannons, soldiers and generals give the number of rows to
+    move, the other pieces the file they land on.
+    :param position: The Xiangqi game the move is played in.
+    :param text: The move text.
+    :return: Tuple of the start and end squares of the move, or None if it is not a move of the current player.
+    """
+    match = WXF_PATTERN.match(text.upper())
+    if match is None:
+        return None
+    if match.group(1) is not None:
+        letter, file_text, operator, target = match.group(1, 2, 3, 4)
+    else:
+        file_text, letter, operator, target = match.group(5, 6, 7, 8)
+    player = position.get_player_turn()
+    name = WXF_PIECES[letter]
+    forward = 1 if player == 'red' else -1
+
+    candidates = [i for i in position.get_active_pieces()
+                  if i.get_player() == player and i.get_piece_name() == name]
+    if file_text in ('+', '-'):
+        # Front and rear are the pieces furthest forward and furthest back on a file shared by two of them.
+        columns = [i.get_square() % 9 for i in candidates]
+        candidates = [i for i in candidates if columns.count(i.get_square() % 9) > 1]
+        candidates.sort(key=lambda piece: piece.get_square() // 9 * forward, reverse=file_text == '+')
+        candidates = candidates[:1]
+    else:
+        column = wxf_column(player, int(file_text))
+        candidates = [i for i in candidates if i.get_square() % 9 == column]
+
+    target = int(target)
+    for piece in candidates:
+        row, column = divmod(piece.get_square(), 9)
+        if operator in ('.', '='):
+            end_row, end_column = row, wxf_column(player, target)
+        else:
+            direction = forward if operator == '+' else -forward
+            if name in ('CHARIOT', 'CANNON', 'SOLDIER', 'GENERAL'):
+                end_row, end_column = row + direction * target, column
+            else:
+                end_column = wxf_column(player, target)
+                if name == 'HORSE':
+                    rows = 3 - abs(end_column - column)
+                else:
+                    rows = 1 if name == 'ADVISOR' else 2
+                end_row = row + direction * rows
+        if 0 <= end_row < 10 and 0 <= end_column < 9:
+            move = (piece.get_square(), end_row * 9 + end_column)
+            if position.is_pseudo_legal(move):
+                return move
+    return None
+
+
+def game_notation(tags, default):
+    """
+    :param tags: Tag dictionary of a game.
+    :param default: 'iccs' or 'wxf', used when the game has no Format tag naming one of them.
+    :return: The move notation of the game, 'iccs' or 'wxf'.
+    """
+    notation = tags.get('Format', default).lower()
+    return notation if notation in ('iccs', 'wxf') else default
+
+
+def legal_moves(position, moves, notation='iccs'):
+    """
+    Yields the moves of a game with the position each is played from, stopping at the first move that is not legal.
+    The caller plays each move with push before taking the next one, as the move texts are read in that position.
+    :param position: The Xiangqi game the moves are played in, at the start of the game.
+    :param moves: The move texts of the game.
+    :param notation: 'iccs' or 'wxf'.
+    :return: Yields a (position, move) tuple per legal move.
+    """
+    for text in moves:
+        move = parse_iccs(text) if notation == 'iccs' else parse_wxf(position, text)
+        if move is None or not position.is_pseudo_legal(move) or not position.is_legal_move(move):
+            return
+        yield position, move
+
+
+def replay_game(moves, fen=None, notation='iccs', snapshots=False, game=0, tags=None, backend='pieces'):
+    """
+    Plays the moves of one game, stopping at the first move that is not legal.
+    :param moves: The move texts of the game.
+    :param fen: The position the game starts from, defaults to the starting position.
+    :param notation: 'iccs' or 'wxf'.
+    :param snapshots: True to keep the FEN after every move.
+    :param game: Index of the game, copied to the result.
+    :param tags: Tag dictionary of the game, copied to the result.
+    :param backend: Move generator backend of the game.
+    :return: ReplayResult of the game, with the state INVALID_SETUP if the FEN can't be read.
+    """
+    tags = tags if tags is not None else {}
+    moves = list(moves)
+    try:
+        position = Xiangqi.from_fen(fen or START_FEN, backend)
+    except ValueError as error:
+        return ReplayResult(game, 'INVALID_SETUP', 0, None, None, fen, [] if snapshots else None, tags, str(error))
+    fens = [] if snapshots else None
+    played = 0
+    for position, move in legal_moves(position, moves, notation):
+        position.push(move)
+        played += 1
+        if snapshots:
+            fens.append(position.to_fen())
+    illegal_move = played if played < len(moves) else None
+    illegal_text = moves[played] if played < len(moves) else None
+
+    # Only the final position can end the game, a move after checkmate or stalemate is not legal.
+    position.update_game_state()
+    return ReplayResult(game, position.get_game_state(), played, illegal_move, illegal_text, position.to_fen(), fens,
+                        tags)
+
+
+def replay(source, notation='iccs', snapshots=False, backend='pieces'):
+    """
+    Replays every game of a game record source in turn.
+    :param source: A file path, an open text file, or an iterable of lines.
+    :param notation: 'iccs' or 'wxf', used when a game has no Format tag naming one of them.
+    :param snapshots: True to keep the FEN after every move of every game.
+    :param backend: Move generator backend of the games.
+    :return: Yields a ReplayResult per game.
+    """
+    for index, (tags, moves) in enumerate(read_games(source)):
+        yield replay_game(moves, tags.get('FEN'), game_notation(tags, notation), snapshots, index, tags, backend)
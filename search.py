@@ -0,0 +1,240 @@
+# Name: Xiangqi Search
+# Language: Python 3
+# Description: Alpha-beta search for the game Xiangqi. Finds the best move for the current player of a Xiangqi game
+# with iterative deepening, a transposition table, move ordering and a quiescence search of captures.
+
+# Modules
+import time
+
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Score of checkmating the other player. Scores within MATE_BOUND of it are mates, nearer mates scoring higher.
+MATE_SCORE = 30000
+MATE_BOUND = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+
+# Number of nodes between checks of the time limit.
+TIME_CHECK_NODES = 1024
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time limit runs out."""
+
+
+def search(position, depth=None, time_limit=None, table=None):
+    """
+    Finds the best move for the current player of a game.
+    :param position: The Xiangqi game to search. It is searched with push and pop and left as it was found.
+    :param depth: Maximum depth to search in plies. Defaults to MAX_DEPTH when only a time limit is given.
+    :param time_limit: Wall clock budget in seconds. The deepest completed iteration is used when it runs out.
+    :param table: TranspositionTable to use, so results can be kept between searches. A new one is made if None.
+    :return: Tuple of the best move as (start, end) squares, or None if there is no move, and its score in the
+    point of view of the current player.
+    """
+    return Searcher(table).search(position, depth, time_limit)
+
+
+def score_to_table(score, ply):
+    """Converts a mate score counted from the root into one counted from the stored position."""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    """Converts a stored mate score back into one counted from the root."""
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    Iterative deepening alpha-beta search over the legal moves of each position. A player with no legal move loses,
+    whether checkmated or stalemated.
+
+    :items:
+    _table - Transposition table of searched positions.
+    _killers - Two quiet moves per ply that last caused a beta cutoff.
+    _history - Score per (start, end) quiet move, raised each time it causes a beta cutoff.
+    _nodes - Number of positions searched.
+    _deadline - time.monotonic() value when the search must stop, or None.
+    _completed_depth - Depth of the last fully searched iteration.
+    _root_move - Best move found so far at the root of the current iteration.
+    """
+
+    def __init__(self, table=None, history=None):
+        """
+        :param table: TranspositionTable or SharedTranspositionTable to use. A new TranspositionTable is made if None.
+        :param history: Starting history scores of quiet moves, so searchers sharing a table can order their moves
+        differently. Starts empty if None.
+        """
+        if table is None:
+            table = TranspositionTable()
+        self._table = table
+        self._killers = [[None, None] for _ in range(MAX_DEPTH + 1)]
+        self._history = {} if history is None else dict(history)
+        self._nodes = 0
+        self._deadline = None
+        self._completed_depth = 0
+        self._root_move = None
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_completed_depth(self):
+        return self._completed_depth
+
+    def search(self, position, depth=None, time_limit=None):
+        """
+        Searches the position one ply deeper each iteration until the depth or the time limit is reached. The first
+        iteration always completes so there is a move to return.
+        :return: Tuple of the best move and its score, see search.
+        """
+        if depth is None and time_limit is None:
+            raise ValueError("search needs a depth or a time limit")
+        if depth is None:
+            depth = MAX_DEPTH
+        self._deadline = None if time_limit is None else time.monotonic() + time_limit
+        # check_time only stops a search after its first iteration, so the count of a previous search must not carry
+        # over.
+        self._completed_depth = 0
+        self._root_move = None
+        self._nodes = 0
+        undo_count = position.get_undo_count()
+
+        best_move = None
+        best_score = 0
+        for current_depth in range(1, min(depth, MAX_DEPTH) + 1):
+            self._root_move = None
+            try:
+                score = self.alpha_beta(position, current_depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                while position.get_undo_count() > undo_count:
+                    position.pop()
+                break
+            best_move = self._root_move
+            best_score = score
+            self._completed_depth = current_depth
+            if abs(score) > MATE_BOUND:
+                break
+        return best_move, best_score
+
+    def check_time(self):
+        """
+        Raises SearchTimeout once the deadline has passed or the table has been stopped with set_stopped, after the
+        first iteration.
+        """
+        if self._completed_depth > 0 and (self._table.is_stopped() or
+                                          self._deadline is not None and time.monotonic() > self._deadline):
+            raise SearchTimeout()
+
+    def alpha_beta(self, position, depth, alpha, beta, ply):
+        """
+        Fail soft alpha-beta search of a position.
+        :param position: The Xiangqi game.
+        :param depth: Remaining depth in plies.
+        :param alpha: Lower bound of the score the current player is looking for.
+        :param beta: Upper bound of the score the current player is looking for.
+        :param ply: Distance from the root.
+        :return: The score of the position in the point of view of the current player.
+        """
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_NODES == 0:
+            self.check_time()
+
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+
+        key = position.get_zobrist_key()
+        hash_move = None
+        entry = self._table.probe(key)
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            if ply > 0 and entry_depth >= depth:
+                score = score_from_table(entry_score, ply)
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        killers = self._killers[ply] if ply <= MAX_DEPTH else ()
+        checked = position.in_check(position.get_player_turn())
+        for move in position.staged_moves(hash_move, killers, self._history):
+            if not position.is_legal_move(move, checked):
+                continue
+            victim = position.get_piece_at_square(move[1])
+
+            position.push(move)
+            score = -self.alpha_beta(position, depth - 1, -beta, -alpha, ply + 1)
+            position.pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if ply == 0:
+                    self._root_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if victim is None:
+                    self.record_cutoff(move, depth, ply)
+                break
+
+        # No legal move loses, a stalemated player loses in Xiangqi.
+        if best_move is None:
+            return -(MATE_SCORE - ply)
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._table.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        """
+        Searches captures only until the position is quiet, so the search does not stop in the middle of an
+        exchange. The current player may also stand pat on the score of the position.
+        :return: The score of the position in the point of view of the current player.
+        """
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_NODES == 0:
+            self.check_time()
+
+        stand_pat = position.get_score()
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        checked = position.in_check(position.get_player_turn())
+        for move in position.staged_moves(quiets=False):
+            if not position.is_legal_move(move, checked):
+                continue
+
+            position.push(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.pop()
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def record_cutoff(self, move, depth, ply):
+        """Remembers a quiet move that caused a beta cutoff as a killer and in the history table."""
+        if ply <= MAX_DEPTH and self._killers[ply][0] != move:
+            self._killers[ply][1] = self._killers[ply][0]
+            self._killers[ply][0] = move
+        self._history[move] = self._history.get(move, 0) + depth * depth
@@ -0,0 +1,422 @@
+# Name: Xiangqi Tablebase
+# Language: Python 3
+# Description: Endgame tablebases for small Xiangqi endings. Every position of a material signature, such as KRvKA
+# for a red general and chariot against a black general and advisor, is solved by retrograde analysis with the move
+# rules of the game. The result is stored as one byte per position in a file per signature, which is memory mapped
+# when it is probed. Positions are indexed by the square of each piece and the player to move, and left-right mirror
+# images share one entry by keeping the red general on the left half of its castle.
+# Usage: python tablebase.py KRvK KRvKA [--directory tablebases]
+
+# Modules
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+
+from Xaingqi import Xiangqi, NewGame, FEN_PIECES, FEN_LETTERS
+from geometry import (SQUARE_COLUMNS, MIRRORED_SQUARES, FLIPPED_SQUARES, GENERAL_MOVES, ADVISOR_MOVES, ELEPHANT_MOVES,
+                      SOLDIER_MOVES, PIECE_NAMES, PIECE_CODES)
+
+# Byte values of a table entry. Any other value is the number of plies to mate plus one, from the point of view of
+# the player to move: an odd number of plies is a win for them and an even number a loss, 0 plies being checkmated
+# or stalemated now. Repetition rules are not modelled, so a position without a forced mate is a draw.
+DRAW = 0
+ILLEGAL = 255
+MAX_PLIES = ILLEGAL - 2
+
+TABLE_EXTENSION = '.xtb'
+
+# Piece names of the FEN letters of a signature, including E and H for the elephant and horse.
+LETTER_NAMES = {letter: piece_class().get_piece_name() for letter, piece_class in FEN_PIECES.items()}
+
+
+def reachable_squares(move_table, squares):
+    """
+    :param move_table: Tuple indexed by square of tuples of (destination, block) squares.
+    :param squares: Squares a piece starts the game on.
+    :return: Sorted tuple of every square the piece can reach from them.
+    """
+    found = set(squares)
+    stack = list(squares)
+    while stack:
+        for position, block in move_table[stack.pop()]:
+            if position not in found:
+                found.add(position)
+                stack.append(position)
+    return tuple(sorted(found))
+
+
+def build_piece_domains():
+    """
+    Precomputes the squares each piece can stand on. Generals, advisors, elephants and soldiers only reach part of
+    the board from where they start, the other pieces reach every square.
+    :return: Dictionary keyed by (player, name) of sorted tuples of squares.
+    """
+    start_squares = {}
+    for i in NewGame():
+        start_squares.setdefault((i.get_player(), i.get_piece_name()), []).append(i.get_square())
+    domains = {}
+    for player in ('red', 'black'):
+        for name, table in (('GENERAL', GENERAL_MOVES[player]), ('ADVISOR', ADVISOR_MOVES[player]),
+                            ('ELEPHANT', ELEPHANT_MOVES[player]), ('SOLDIER', SOLDIER_MOVES[player])):
+            domains[(player, name)] = reachable_squares(table, start_squares[(player, name)])
+        for name in ('HORSE', 'CHARIOT', 'CANNON'):
+            domains[(player, name)] = tuple(range(90))
+    return domains
+
+
+PIECE_DOMAINS = build_piece_domains()
+
+
+def opponent(player):
+    """
+    :return: The other player of 'red' or 'black'.
+    """
+    return 'black' if player == 'red' else 'red'
+
+
+def get_placement(position):
+    """
+    :param position: The Xiangqi game.
+    :return: List of (player, name, square) of the pieces on the board.
+    """
+    return [(i.get_player(), i.get_piece_name(), i.get_square()) for i in position.get_active_pieces()]
+
+
+def get_signature(placement):
+    """
+    Names the material of a placement, the FEN letters of the red pieces then of the black pieces in the order of
+    PIECE_NAMES, split by a v. For example KRvKA.
+    :param placement: List of (player, name, square) of the pieces.
+    :return: The material signature.
+    """
+    names = {'red': [], 'black': []}
+    for player, name, square in placement:
+        names[player].append(name)
+    return 'v'.join(''.join(FEN_LETTERS[name] for name in sorted(names[player], key=PIECE_NAMES.index))
+                    for player in ('red', 'black'))
+
+
+def flip_placement(placement):
+    """
+    Swaps the colours of the pieces and turns the board upside down, which leaves the result of a position the same
+    when the player to move is swapped too.
+    :param placement: List of (player, name, square) of the pieces.
+    :return: The flipped placement.
+    """
+    return [(opponent(player), name, FLIPPED_SQUARES[square]) for player, name, square in placement]
+
+
+def value_result(value):
+    """
+    :param value: A table byte.
+    :return: Tuple of 'WIN', 'LOSS' or 'DRAW' for the player to move and the plies to mate, None for a draw.
+    """
+    if value == DRAW:
+        return 'DRAW', None
+    plies = value - 1
+    return ('WIN' if plies % 2 else 'LOSS'), plies
+
+
+class Material:
+    """
+    Index scheme of the positions of one material signature.
+
+    :items:
+    _signature - The material signature, such as KRvKA.
+    _pieces - Tuple of (player, name) of each piece, red first and each player in the order of PIECE_NAMES.
+    _domains - Tuple of the squares each piece can stand on. The red general is kept on columns 0 - 4.
+    _offsets - Tuple of dictionaries of the index of each square within the domain of each piece.
+    _size - Number of positions, the product of the domain sizes times two players to move.
+    """
+
+    def __init__(self, signature):
+        """
+        :param signature: The material signature, one K and any other FEN letters per player, such as KRvKA.
+        """
+        sides = signature.split('v')
+        if len(sides) != 2 or any(side.count('K') != 1 or not side.startswith('K') or
+                                  any(letter not in LETTER_NAMES for letter in side) for side in sides):
+            raise ValueError("a signature is the pieces of red then black starting with K, such as KRvKA: " +
+                             signature)
+        self._pieces = tuple((player, name)
+                             for player, side in zip(('red', 'black'), sides)
+                             for name in sorted((LETTER_NAMES[letter] for letter in side), key=PIECE_NAMES.index))
+        self._signature = get_signature([(player, name, 0) for player, name in self._pieces])
+        self._domains = tuple(PIECE_DOMAINS[piece] if index else
+                              tuple(i for i in PIECE_DOMAINS[piece] if SQUARE_COLUMNS[i] <= 4)
+                              for index, piece in enumerate(self._pieces))
+        self._offsets = tuple({square: offset for offset, square in enumerate(domain)} for domain in self._domains)
+        self._size = 2
+        for domain in self._domains:
+            self._size *= len(domain)
+
+    def get_signature(self):
+        """
+        :return: The material signature.
+        """
+        return self._signature
+
+    def get_size(self):
+        """
+        :return: The number of positions of the signature.
+        """
+        return self._size
+
+    def get_index(self, placement, player_turn):
+        """
+        Finds the index of a position, mirroring it first when the red general is on the right half of its castle.
+        Pieces of the same player and name take the slots of that name in square order.
+        :param placement: List of (player, name, square) of the pieces, with the material of the signature.
+        :param player_turn: The player to move.
+        :return: The index of the position, or None if a piece is on a square the table has no place for, such as a
+        general outside its castle.
+        """
+        squares = {}
+        for player, name, square in placement:
+            squares.setdefault((player, name), []).append(square)
+        if SQUARE_COLUMNS[squares[('red', 'GENERAL')][0]] > 4:
+            squares = {piece: [MIRRORED_SQUARES[i] for i in piece_squares] for piece, piece_squares in squares.items()}
+        for piece_squares in squares.values():
+            piece_squares.sort(reverse=True)
+
+        index = 0 if player_turn == 'red' else 1
+        for piece, offsets in zip(self._pieces, self._offsets):
+            offset = offsets.get(squares[piece].pop())
+            if offset is None:
+                return None
+            index = index * len(offsets) + offset
+        return index
+
+    def get_position(self, index):
+        """
+        :param index: The index of a position, 0 - get_size() - 1.
+        :return: Tuple of the placement list of (player, name, square) and the player to move.
+        """
+        placement = []
+        for piece, domain in zip(reversed(self._pieces), reversed(self._domains)):
+            index, offset = divmod(index, len(domain))
+            placement.append(piece + (domain[offset],))
+        placement.reverse()
+        return placement, 'black' if index else 'red'
+
+
+def encode_position(placement, player_turn):
+    """
+    :param placement: List of (player, name, square) of the pieces.
+    :param player_turn: The player to move.
+    :return: The position in the compact encoding of Xiangqi.to_bytes.
+    """
+    cells = array('b', bytes(91))
+    for player, name, square in placement:
+        cells[square] = PIECE_CODES[name] if player == 'red' else -PIECE_CODES[name]
+    cells[90] = 0 if player_turn == 'red' else 1
+    return cells.tobytes()
+
+
+def table_path(directory, signature):
+    """
+    :return: The path of the table file of a signature in a directory.
+    """
+    return os.path.join(directory, signature + TABLE_EXTENSION)
+
+
+def lookup_value(tables, directory, placement, player_turn):
+    """
+    Looks up a position in the table of its material, which is read from the directory or built there if needed.
+    :param tables: Dictionary of signature to (Material, table bytes) of the tables already read or built.
+    :param directory: Directory of the table files.
+    :param placement: List of (player, name, square) of the pieces.
+    :param player_turn: The player to move.
+    :return: The table byte of the position.
+    """
+    signature = get_signature(placement)
+    if signature not in tables:
+        path = table_path(directory, signature)
+        if os.path.exists(path):
+            material = Material(signature)
+            with open(path, 'rb') as file:
+                values = file.read()
+            if len(values) != material.get_size():
+                raise ValueError("table file does not match its signature: " + path)
+            tables[signature] = (material, values)
+        else:
+            build_table(signature, directory, tables)
+    material, values = tables[signature]
+    return values[material.get_index(placement, player_turn)]
+
+
+def build_table(signature, directory, tables=None):
+    """
+    Solves every position of a material signature by retrograde analysis and writes its table file. The tables of
+    the material left after a capture are read from the directory, or built first when they are missing.
+
+    Every legal position is set up once to find its legal moves. Positions without one are lost now, and moves that
+    capture take their result from the smaller table. Then each pass n resolves the positions won in n plies, those
+    with a move to a position lost in n - 1, or lost in n plies, those whose moves all reach won positions and the
+    slowest win takes n - 1. Positions still open when the passes stop finding any are draws.
+    :param signature: The material signature, such as KRvKA.
+    :param directory: Directory of the table files.
+    :param tables: Dictionary of signature to (Material, table bytes) of the tables already read or built, which the
+    new table is added to.
+    :return: The table as a bytearray indexed by Material.get_index.
+    """
+    if tables is None:
+        tables = {}
+    material = Material(signature)
+    size = material.get_size()
+    values = bytearray(size)
+    children = {}
+    horizon = 0
+
+    for index in range(size):
+        placement, player_turn = material.get_position(index)
+        squares = set(square for player, name, square in placement)
+        # Overlapping pieces, same named pieces out of square order and mirror images of another index are not used.
+        if len(squares) < len(placement) or material.get_index(placement, player_turn) != index:
+            values[index] = ILLEGAL
+            continue
+        position = Xiangqi.from_bytes(encode_position(placement, player_turn))
+        if position.in_check(opponent(player_turn)):
+            values[index] = ILLEGAL
+            continue
+
+        moves = position.legal_moves()
+        if not moves:
+            values[index] = 1
+            continue
+        inner = array('l')
+        outer = bytearray()
+        for move in moves:
+            position.push(move)
+            child = get_placement(position)
+            if len(child) < len(placement):
+                outer.append(lookup_value(tables, directory, child, opponent(player_turn)))
+            else:
+                inner.append(material.get_index(child, opponent(player_turn)))
+            position.pop()
+        children[index] = (inner, outer)
+        horizon = max(horizon, max(outer, default=0))
+
+    plies = 1
+    last_change = 0
+    while children and plies <= MAX_PLIES and (plies <= horizon or plies - last_change <= 2):
+        resolved = []
+        for index, (inner, outer) in children.items():
+            child_values = [values[i] for i in inner]
+            child_values.extend(outer)
+            if plies % 2:
+                # Won in plies: some move reaches a position lost in plies - 1, stored as plies.
+                if plies in child_values:
+                    resolved.append(index)
+            elif all(value and value % 2 == 0 for value in child_values) and max(child_values) == plies:
+                resolved.append(index)
+        for index in resolved:
+            values[index] = plies + 1
+            del children[index]
+        if resolved:
+            last_change = plies
+        plies += 1
+
+    os.makedirs(directory, exist_ok=True)
+    with open(table_path(directory, material.get_signature()), 'wb') as file:
+        file.write(values)
+    tables[material.get_signature()] = (material, values)
+    return values
+
+
+class Tablebase:
+    """
+    Read only view of the table files in a directory, each memory mapped when its material is first probed.
+
+    :items:
+    _directory - Directory of the table files.
+    _tables - Dictionary of signature to (Material, open file, memory map), or None when there is no table file.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory of the table files written by build_table.
+        """
+        self._directory = directory
+        self._tables = {}
+
+    def close(self):
+        """Unmaps and closes every table file."""
+        for table in self._tables.values():
+            if table is not None:
+                table[2].close()
+                table[1].close()
+        self._tables = {}
+
+    def get_table(self, signature):
+        """
+        :param signature: The material signature, such as KRvKA.
+        :return: Tuple of the Material and memory map of the table, or None if there is no table for it.
+        """
+        if signature not in self._tables:
+            path = table_path(self._directory, signature)
+            table = None
+            if os.path.exists(path):
+                material = Material(signature)
+                file = open(path, 'rb')
+                if file.seek(0, 2) != material.get_size():
+                    file.close()
+                    raise ValueError("table file does not match its signature: " + path)
+                table = (material, file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            self._tables[signature] = table
+        table = self._tables[signature]
+        return None if table is None else (table[0], table[2])
+
+    def probe(self, position):
+        """
+        Looks up the result of a position. A position with the colours of a table swapped, such as KvKR in the table
+        of KRvK, is found by turning the board upside down.
+        :param position: The Xiangqi game.
+        :return: Tuple of 'WIN', 'LOSS' or 'DRAW' for the player to move and the plies to mate, None for a draw. None
+        if there is no table for the material of the position or the position can't arise in a game.
+        """
+        placement = get_placement(position)
+        player_turn = position.get_player_turn()
+        table = self.get_table(get_signature(placement))
+        if table is None:
+            placement = flip_placement(placement)
+            player_turn = opponent(player_turn)
+            table = self.get_table(get_signature(placement))
+            if table is None:
+                return None
+        material, values = table
+        index = material.get_index(placement, player_turn)
+        if index is None:
+            return None
+        value = values[index]
+        if value == ILLEGAL:
+            return None
+        return value_result(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build Xiangqi endgame tablebases by retrograde analysis.")
+    parser.add_argument("signatures", nargs="+", help="material signatures, such as KRvK or KRvKA")
+    parser.add_argument("--directory", default="tablebases", help="directory of the table files (default tablebases)")
+    args = parser.parse_args(argv)
+
+    tables = {}
+    for signature in args.signatures:
+        start_time = time.perf_counter()
+        values = build_table(signature, args.directory, tables)
+        counts = {'WIN': 0, 'LOSS': 0, 'DRAW': 0}
+        for value in values:
+            if value != ILLEGAL:
+                counts[value_result(value)[0]] += 1
+        longest = max((value - 1 for value in values if value not in (DRAW, ILLEGAL)), default=0)
+        print("%s: %d entries, %d wins, %d losses, %d draws, longest mate %d plies (%.1fs)" %
+              (signature, len(values), counts['WIN'], counts['LOSS'], counts['DRAW'], longest,
+               time.perf_counter() - start_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
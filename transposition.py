@@ -0,0 +1,332 @@
+# Name: Xiangqi Transposition Table
+# Language: Python 3
+# Description: Fixed size transposition table for searches over Xiangqi positions. Results are keyed by the 64 bit
+# Zobrist key of the position and kept in preallocated arrays, so the table never grows past the size it was given.
+# SharedTranspositionTable keeps the same entries in shared memory for searches running in several processes.
+
+# Modules
+from array import array
+from multiprocessing import shared_memory
+
+# Bound types of a stored score.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Moves are stored as start * 90 + end, with NO_MOVE when a result has no best move.
+NO_MOVE = 0xFFFF
+
+# Bytes used by one entry: key, score, move, depth and bound.
+ENTRY_SIZE = 8 + 4 + 2 + 1 + 1
+
+
+def encode_move(move):
+    """
+    Packs a move into a 16 bit number.
+    :param move: Tuple of the start and end squares of the move, or None.
+    :return: start * 90 + end, or NO_MOVE for None.
+    """
+    if move is None:
+        return NO_MOVE
+    return move[0] * 90 + move[1]
+
+
+def decode_move(value):
+    """
+    Unpacks a move packed by encode_move.
+    :param value: The packed move.
+    :return: Tuple of the start and end squares of the move, or None for NO_MOVE.
+    """
+    if value == NO_MOVE:
+        return None
+    return divmod(value, 90)
+
+
+def position_key(position):
+    """
+    :param position: A Xiangqi game.
+    :return: The 64 bit key the table uses for the position and player turn.
+    """
+    return position.get_zobrist_key()
+
+
+class TranspositionTable:
+    """
+    Transposition table made of buckets of two entries. The first entry of a bucket is depth preferred: it is only
+    replaced by a result searched at least as deep, or by a newer result for the same position. The second entry is
+    always replaced, and also receives whatever the first entry held when that is replaced by a different position.
+
+    :items:
+    _bucket_mask - Number of buckets minus one, the bucket count is a power of two.
+    _keys - Key of each entry.
+    _scores - Score of each entry.
+    _moves - Best move of each entry, packed with encode_move.
+    _depths - Search depth of each entry, -1 for an empty entry.
+    _bounds - Bound type of each entry, EXACT, LOWER_BOUND or UPPER_BOUND.
+    _hits - Number of probes that found their position.
+    _misses - Number of probes that did not find their position.
+    _collisions - Number of misses where the bucket was full of other positions.
+    _stopped - True once set_stopped asks the searches using the table to stop.
+    """
+
+    def __init__(self, megabytes=16):
+        """
+        Allocates every entry of the table up front.
+        :param megabytes: Memory budget of the table. The entry count is rounded down to a power of two buckets.
+        """
+        entries = max(2, megabytes * 1024 * 1024 // ENTRY_SIZE)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self._bucket_mask = buckets - 1
+
+        self._keys = array('Q', bytes(8 * 2 * buckets))
+        self._scores = array('i', bytes(4 * 2 * buckets))
+        self._moves = array('H', [NO_MOVE]) * (2 * buckets)
+        self._depths = array('b', [-1]) * (2 * buckets)
+        self._bounds = array('b', bytes(2 * buckets))
+
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+        self._stopped = False
+
+    def get_size(self):
+        """
+        :return: The number of entries in the table.
+        """
+        return len(self._keys)
+
+    def is_stopped(self):
+        """
+        :return: True if the searches using the table have been asked to stop, see set_stopped.
+        """
+        return self._stopped
+
+    def set_stopped(self, stopped=True):
+        """
+        Asks the searches using the table to stop, which they do at their next time check after their first iteration.
+        :param stopped: True to stop the searches, False to let new searches run.
+        """
+        self._stopped = stopped
+
+    def get_hits(self):
+        return self._hits
+
+    def get_misses(self):
+        return self._misses
+
+    def get_collisions(self):
+        return self._collisions
+
+    def clear(self):
+        """Empties every entry and resets the counters."""
+        self._depths[:] = array('b', [-1]) * len(self._depths)
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+
+    def probe(self, key):
+        """
+        Looks up the stored result of a position.
+        :param key: The 64 bit key of the position.
+        :return: Tuple of depth, score, bound and best move, or None if the position is not stored.
+        """
+        slot = (key & self._bucket_mask) << 1
+        for i in (slot, slot + 1):
+            if self._depths[i] >= 0 and self._keys[i] == key:
+                self._hits += 1
+                return self._depths[i], self._scores[i], self._bounds[i], decode_move(self._moves[i])
+
+        self._misses += 1
+        if self._depths[slot] >= 0 and self._depths[slot + 1] >= 0:
+            self._collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores the result of searching a position, following the replacement policy of the table.
+        :param key: The 64 bit key of the position.
+        :param depth: The depth the position was searched to, 0 - 127.
+        :param score: The score of the position.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param move: The best move found as a tuple of start and end squares, or None.
+        """
+        slot = (key & self._bucket_mask) << 1
+        if self._depths[slot] < 0 or self._keys[slot] == key or depth >= self._depths[slot]:
+            # Keep the replaced result of another position in the always replace entry.
+            if self._depths[slot] >= 0 and self._keys[slot] != key:
+                self.write_entry(slot + 1, self._keys[slot], self._depths[slot], self._scores[slot],
+                                 self._bounds[slot], self._moves[slot])
+            elif self._keys[slot + 1] == key:
+                self._depths[slot + 1] = -1
+            self.write_entry(slot, key, depth, score, bound, encode_move(move))
+        else:
+            self.write_entry(slot + 1, key, depth, score, bound, encode_move(move))
+
+    def write_entry(self, index, key, depth, score, bound, move):
+        """Writes one entry of the table, with the move already packed."""
+        self._keys[index] = key
+        self._depths[index] = min(depth, 127)
+        self._scores[index] = score
+        self._bounds[index] = bound
+        self._moves[index] = move
+
+
+def pack_entry(depth, score, bound, move):
+    """
+    Packs the data of a shared table entry into one 64 bit word: depth + 1 in bits 0 - 7, so an empty entry is 0, the
+    bound in bits 8 - 15, the packed move in bits 16 - 31 and the score as a 32 bit two's complement number above.
+    """
+    return (min(depth, 127) + 1) | (bound << 8) | (move << 16) | ((score & 0xFFFFFFFF) << 32)
+
+
+def unpack_entry(data):
+    """
+    Unpacks a word made by pack_entry.
+    :return: Tuple of depth, score, bound and packed move.
+    """
+    score = data >> 32
+    if score >= 1 << 31:
+        score -= 1 << 32
+    return (data & 0xFF) - 1, score, (data >> 8) & 0xFF, (data >> 16) & 0xFFFF
+
+
+class SharedTranspositionTable:
+    """
+    Transposition table held in shared memory, so worker processes searching the same position can share results. It
+    has the same buckets, replacement policy and methods as TranspositionTable. Each entry is two 64 bit words, the
+    packed data and the key XOR the data. Entries are written without locks, and a probe only accepts an entry whose
+    words XOR back to the key, so an entry torn by two processes writing at once reads as a miss. One byte after the
+    entries is the stop flag of set_stopped, seen by every process attached to the table.
+
+    :items:
+    _memory - The SharedMemory block holding the entries and the stop flag.
+    _words - The entries of the block seen as 64 bit words, two per entry.
+    _flags - The stop flag byte of the block.
+    _bucket_mask - Number of buckets minus one, the bucket count is a power of two.
+    _owner - True for the process that created the block, which must unlink it.
+    _hits - Number of probes of this process that found their position.
+    _misses - Number of probes of this process that did not find their position.
+    _collisions - Number of misses where the bucket was full of other positions.
+    """
+
+    def __init__(self, megabytes=16, name=None):
+        """
+        Creates a new table, or attaches to the table of another process.
+        :param megabytes: Memory budget of the table, rounded down like TranspositionTable. Processes sharing a table
+        must pass the same budget.
+        :param name: Name of an existing table from get_name, or None to create a new one.
+        """
+        entries = max(2, megabytes * 1024 * 1024 // ENTRY_SIZE)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self._bucket_mask = buckets - 1
+        self._owner = name is None
+
+        entry_bytes = ENTRY_SIZE * 2 * buckets
+        self._memory = shared_memory.SharedMemory(name=name, create=self._owner, size=entry_bytes + 1)
+        self._words = self._memory.buf[:entry_bytes].cast('Q')
+        self._flags = self._memory.buf[entry_bytes:entry_bytes + 1]
+        if self._owner:
+            self.clear()
+            self.set_stopped(False)
+
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+
+    def get_name(self):
+        """
+        :return: The name other processes attach to the table with.
+        """
+        return self._memory.name
+
+    def get_size(self):
+        """
+        :return: The number of entries in the table.
+        """
+        return len(self._words) // 2
+
+    def is_stopped(self):
+        """
+        :return: True if the searches using the table have been asked to stop, see set_stopped.
+        """
+        return self._flags[0] != 0
+
+    def set_stopped(self, stopped=True):
+        """
+        Asks the searches using the table in every process to stop, which they do at their next time check after
+        their first iteration.
+        :param stopped: True to stop the searches, False to let new searches run.
+        """
+        self._flags[0] = 1 if stopped else 0
+
+    def get_hits(self):
+        return self._hits
+
+    def get_misses(self):
+        return self._misses
+
+    def get_collisions(self):
+        return self._collisions
+
+    def close(self):
+        """Detaches this process from the table, and frees the shared memory if this process created it."""
+        self._words.release()
+        self._flags.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def clear(self):
+        """Empties every entry and resets the counters of this process."""
+        self._memory.buf[:len(self._words) * 8] = bytes(len(self._words) * 8)
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+
+    def probe(self, key):
+        """
+        Looks up the stored result of a position.
+        :param key: The 64 bit key of the position.
+        :return: Tuple of depth, score, bound and best move, or None if the position is not stored.
+        """
+        words = self._words
+        slot = (key & self._bucket_mask) << 1
+        for i in (slot, slot + 1):
+            data = words[2 * i + 1]
+            if data and words[2 * i] ^ data == key:
+                self._hits += 1
+                depth, score, bound, move = unpack_entry(data)
+                return depth, score, bound, decode_move(move)
+
+        self._misses += 1
+        if words[2 * slot + 1] and words[2 * slot + 3]:
+            self._collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores the result of searching a position, following the replacement policy of TranspositionTable.
+        :param key: The 64 bit key of the position.
+        :param depth: The depth the position was searched to, 0 - 127.
+        :param score: The score of the position.
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+        :param move: The best move found as a tuple of start and end squares, or None.
+        """
+        words = self._words
+        slot = (key & self._bucket_mask) << 1
+        data = words[2 * slot + 1]
+        slot_key = words[2 * slot] ^ data
+        if not data or slot_key == key or depth >= unpack_entry(data)[0]:
+            # Keep the replaced result of another position in the always replace entry.
+            if data and slot_key != key:
+                self.write_entry(slot + 1, slot_key, data)
+            elif words[2 * slot + 2] ^ words[2 * slot + 3] == key:
+                self.write_entry(slot + 1, 0, 0)
+            self.write_entry(slot, key, pack_entry(depth, score, bound, encode_move(move)))
+        else:
+            self.write_entry(slot + 1, key, pack_entry(depth, score, bound, encode_move(move)))
+
+    def write_entry(self, index, key, data):
+        """Writes one entry of the table, with its data already packed. An empty entry is written as 0, 0."""
+        self._words[2 * index + 1] = data
+        self._words[2 * index] = key ^ data
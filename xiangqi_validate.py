@@ -0,0 +1,168 @@
+# Name: Xiangqi Validate
+# Language: Python 3
+# Description: Bulk validator of Xiangqi game records. The record files of a directory are cut into byte ranges of a
+# few megabytes at game boundaries, and the ranges are shared out to a pool of worker processes, so one large archive
+# is replayed on every core and no worker holds more than one range of results. Every game is replayed with replay.py.
+# One line per game is written to a tab separated result file, and the throughput is reported when all files are done.
+# Usage: python xiangqi_validate.py <directory> [--output results.tsv] [--workers 8] [--pattern "*.pgn"]
+#        [--notation wxf] [--chunk-size 16]
+
+# Modules
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+
+from replay import read_games, game_notation, replay_game
+
+RESULT_HEADER = "game\toutcome\tillegal_move\tplies\terror"
+
+
+def find_record_files(directory, pattern):
+    """
+    :param directory: Directory searched with its subdirectories.
+    :param pattern: Shell pattern the file names must match, such as *.pgn.
+    :return: Sorted list of the paths of the game record files.
+    """
+    paths = []
+    for root, directories, files in os.walk(directory):
+        for name in files:
+            if fnmatch(name, pattern):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def split_file(path, chunk_bytes):
+    """
+    :param path: Path of a record file.
+    :param chunk_bytes: Size of each range in bytes.
+    :return: List of (path, start, end) byte ranges covering the file, at least one even for an empty file.
+    """
+    size = os.path.getsize(path)
+    return [(path, start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)] or [(path, 0, 0)]
+
+
+def find_game_start(file, offset):
+    """
+    Finds the first game boundary at or after a byte offset: a tag line that follows a line of moves. Workers of
+    neighbouring ranges both call this at the offset between them, so each game is replayed by exactly one of them.
+    Files without tag lines have no boundary after the start, so the range holding the start replays all of them.
+    :param file: The record file, opened in binary mode.
+    :param offset: Byte offset to search from.
+    :return: Byte offset of the boundary, or the file size if there is none.
+    """
+    if offset == 0:
+        return 0
+    file.seek(offset - 1)
+    file.readline()
+    position = file.tell()
+    moves_seen = False
+    for line in iter(file.readline, b''):
+        text = line.strip()
+        if text.startswith(b'['):
+            if moves_seen:
+                return position
+        elif text:
+            moves_seen = True
+        position += len(line)
+    return position
+
+
+def read_range(path, start, end):
+    """
+    Yields the lines of the games of one byte range of a record file, see find_game_start.
+    :param path: Path of the record file.
+    :param start: Byte offset the range starts at.
+    :param end: Byte offset the range ends at, the end of the file for the last range.
+    """
+    with open(path, 'rb') as file:
+        stop = find_game_start(file, end) if end < file.seek(0, 2) else end
+        position = find_game_start(file, start)
+        file.seek(position)
+        while position < stop:
+            line = file.readline()
+            position += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+def validate_range(path, start, end, notation):
+    """
+    Replays every game of one byte range of a record file, in a worker process. An error replaying one game is
+    reported for that game and the next game is replayed, and an error reading the file ends the range with one
+    error row.
+    :param path: Path of the record file.
+    :param start: Byte offset the range starts at.
+    :param end: Byte offset the range ends at.
+    :param notation: 'iccs' or 'wxf' for games without a Format tag.
+    :return: Tuple of the rows of the games, each (outcome, illegal move, plies, error), the number of moves played
+    and the number of games with an illegal move or an error.
+    """
+    rows = []
+    moves = 0
+    failed = 0
+    try:
+        for tags, game_moves in read_games(read_range(path, start, end)):
+            try:
+                result = replay_game(game_moves, tags.get('FEN'), game_notation(tags, notation), tags=tags)
+            except Exception as error:
+                rows.append(('ERROR', '-', 0, repr(error)))
+                failed += 1
+                continue
+            illegal_move = '-' if result.illegal_move is None else str(result.illegal_move)
+            rows.append((result.state, illegal_move, result.moves, result.error or '-'))
+            moves += result.moves
+            if result.illegal_move is not None or result.error is not None:
+                failed += 1
+    except Exception as error:
+        rows.append(('ERROR', '-', 0, repr(error)))
+        failed += 1
+    return rows, moves, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay and validate a directory of Xiangqi game records.")
+    parser.add_argument("directory", help="directory of game record files")
+    parser.add_argument("--output", default="results.tsv", help="result file to write (default results.tsv)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default one per processor)")
+    parser.add_argument("--pattern", default="*.pgn", help="pattern of the record file names (default *.pgn)")
+    parser.add_argument("--notation", default="iccs", choices=("iccs", "wxf"),
+                        help="move notation of games without a Format tag (default iccs)")
+    parser.add_argument("--chunk-size", type=float, default=16,
+                        help="megabytes of records per worker task (default 16)")
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+
+    paths = find_record_files(args.directory, args.pattern)
+    chunk_bytes = max(1, int(args.chunk_size * 1024 * 1024))
+    ranges = [file_range for path in paths for file_range in split_file(path, chunk_bytes)]
+    games = {}
+    moves = 0
+    failed = 0
+    start_time = time.perf_counter()
+    with open(args.output, 'w', encoding='utf-8') as output, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        print(RESULT_HEADER, file=output)
+        # Results come back in the order of the ranges, so the games of a file are numbered across its ranges.
+        for (path, start, end), (rows, range_moves, range_failed) in zip(ranges, pool.map(
+                validate_range, *zip(*ranges), [args.notation] * len(ranges))):
+            prefix = os.path.relpath(path, args.directory)
+            for outcome, illegal_move, plies, error in rows:
+                game = games.get(path, 0)
+                games[path] = game + 1
+                print("%s:%d\t%s\t%s\t%d\t%s" % (prefix, game, outcome, illegal_move, plies,
+                                                 error.replace('\t', ' ').replace('\n', ' ')), file=output)
+            moves += range_moves
+            failed += range_failed
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+
+    total = sum(games.values())
+    print("Files: %d  Ranges: %d  Games: %d  Moves: %d  Failed games: %d" % (len(paths), len(ranges), total, moves,
+                                                                             failed))
+    print("Time: %.2fs (%.1f games/s, %.0f moves/s)" % (elapsed, total / elapsed, moves / elapsed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())